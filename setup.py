@@ -32,6 +32,7 @@ setup(
         '': 'src'
     },
     packages=['busta'],
+    test_suite='tests',
     entry_points={
         'console_scripts': [
             'busta=busta.command_line:main'
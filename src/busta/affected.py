@@ -0,0 +1,124 @@
+"""
+Find bundles affected by changed files.
+"""
+import os
+
+from busta.chunks import bundle_chunks
+
+
+class AffectedIndex(object):
+    """
+    Inverted index: file => bundles, module directory => bundles.
+
+    Files of bundles are modules files with dependencies, except files of
+    excluded bundles. Files dropped from bundle as content duplicates are
+    included too: their change could return them into bundle. Module
+    directories are used for files that are not known yet or already removed:
+    such file affects all bundles containing its module or any of module's
+    dependents, except bundles which exclude this module.
+    """
+    config = None  # config object
+    files = None  # dictionary of filename => set of bundles names
+    modules_dirs = None  # dictionary of module directory => set of bundles
+
+    def __init__(self, config):
+        self.config = config
+        self.files = {}
+        self.modules_dirs = {}
+
+        for name, bundle in config.bundles.items():
+            files = self.bundle_files(bundle)
+            if bundle.async_modules:
+                for chunk in bundle_chunks(bundle):
+                    files.extend(chunk.js_files)
+            for filename in files:
+                self.files.setdefault(filename, set()).add(name)
+
+        modules_bundles = self.modules_bundles()
+        for name, module in config.modules.items():
+            if module.is_simple or not os.path.isdir(module.abs_path):
+                continue
+            directory = module.abs_path.rstrip(os.path.sep)
+            self.modules_dirs.setdefault(directory, set()).update(
+                modules_bundles.get(name, ())
+            )
+
+    def bundle_files(self, bundle):
+        """
+        Returns list of bundle files before content deduplication.
+        """
+        excluded = set()
+        for exclude_name in bundle.exclude:
+            exclude = self.config.bundles.get(exclude_name)
+            if exclude is not None:
+                excluded.update(exclude.all_js_files)
+                excluded.update(exclude.all_css_files)
+                excluded.update(exclude.all_template_files)
+
+        return [
+            filename for filename in (bundle.all_js_files +
+                                      bundle.all_css_files +
+                                      bundle.all_template_files)
+            if filename not in excluded
+        ]
+
+    def modules_closure(self, modules_names):
+        """
+        Returns set of modules with all their JS dependencies.
+        """
+        closure = set()
+        stack = list(modules_names)
+        while stack:
+            name = stack.pop()
+            if name in closure or name not in self.config.modules:
+                continue
+            closure.add(name)
+            stack.extend(self.config.modules[name].js_dependencies)
+        return closure
+
+    def modules_bundles(self):
+        """
+        Returns dictionary of module name => set of bundles containing it.
+        """
+        modules_bundles = {}
+        for name, bundle in self.config.bundles.items():
+            excluded = set()
+            for exclude_name in bundle.exclude:
+                exclude = self.config.bundles.get(exclude_name)
+                if exclude is not None:
+                    excluded.update(self.modules_closure(exclude.modules))
+
+            modules_names = bundle.modules + bundle.async_modules
+            for module_name in self.modules_closure(modules_names):
+                if module_name not in excluded:
+                    modules_bundles.setdefault(module_name, set()).add(name)
+        return modules_bundles
+
+    def affected(self, filenames):
+        """
+        Returns sorted list of bundles names affected by changed files.
+        """
+        affected = set()
+        all_bundles = set(self.config.bundles.keys())
+
+        for filename in filenames:
+            filename = os.path.abspath(filename)
+
+            if filename == self.config.config_file:
+                return sorted(all_bundles)
+
+            if filename in self.files:
+                affected.update(self.files[filename])
+                continue
+
+            directory = os.path.dirname(filename)
+            while True:
+                if directory in self.modules_dirs:
+                    affected.update(self.modules_dirs[directory])
+                    break
+                parent = os.path.dirname(directory)
+                if parent == directory:
+                    break
+                directory = parent
+
+        return sorted(affected)
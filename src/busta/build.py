@@ -0,0 +1,736 @@
+"""
+Bundles builder.
+"""
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import partial
+
+from busta.chunks import bundle_chunks, chunks_manifest, loader_script
+from busta.parts import bundle_parts, parts_manifest, stale_parts
+from busta.scheduler import Scheduler, Task
+from busta.shard import read_durations, write_durations
+from busta.template import TemplateCompiler
+from busta.worker import WorkerException, WorkerPool
+from busta.writer import (UMASK, HashedOutputWriter, OutputWriter,
+                          StreamWriter, hashed_name, make_dirs)
+
+
+# build tasks duration guesses (in seconds) for tasks without history
+BYTE_COST = 0.00000002  # read, process and write one byte
+SPAWN_COST = 0.05  # spawn one processor or compiler process
+RESOLVE_COST = 0.001  # resolve bundle files lists
+
+
+class BuildException(Exception):
+    """
+    Build exception.
+    """
+    pass
+
+
+def run_processors(processors, stdin, output, ext):
+    """
+    Pipe stdin file through chain of processors into output writer.
+
+    Processor is shell command or persistent workers pool. Consecutive
+    commands are piped, workers pool input and output are spooled into
+    temporary files.
+    """
+    groups = []
+    for processor in processors:
+        if isinstance(processor, WorkerPool) or not groups or \
+                isinstance(groups[-1], WorkerPool):
+            groups.append(processor if isinstance(processor, WorkerPool)
+                          else [processor])
+        else:
+            groups[-1].append(processor)
+
+    spools = []
+    try:
+        for i, group in enumerate(groups):
+            if i == len(groups) - 1:
+                target = output
+            else:
+                spools.append(tempfile.TemporaryFile())
+                target = StreamWriter(spools[-1])
+
+            if isinstance(group, WorkerPool):
+                try:
+                    group.process(stdin, target, ext)
+                except WorkerException as exc:
+                    raise BuildException(str(exc))
+            else:
+                run_commands(group, stdin, target, ext)
+
+            if target is not output:
+                target.file.seek(0)
+                stdin = target.file
+    finally:
+        for spool in spools:
+            spool.close()
+
+
+def run_commands(commands, stdin, output, ext):
+    """
+    Pipe stdin file through chain of processor commands into output writer.
+
+    Output type ('js' or 'css') is passed to commands as `BUSTA_EXT`
+    environment variable.
+    """
+    env = dict(os.environ, BUSTA_EXT=ext)
+
+    processes = []
+    try:
+        for command in commands:
+            stderr = tempfile.TemporaryFile()
+            try:
+                process = subprocess.Popen(
+                    command,
+                    shell=True,
+                    env=env,
+                    stdin=stdin,
+                    stdout=subprocess.PIPE,
+                    stderr=stderr
+                )
+            except OSError as exc:
+                stderr.close()
+                raise BuildException(
+                    "Error while running '{0}': {1}".format(command, exc)
+                )
+            if processes:
+                # let previous process get SIGPIPE if this one exits
+                stdin.close()
+            processes.append((command, process, stderr))
+            stdin = process.stdout
+
+        output.copy(stdin)
+        stdin.close()
+
+        for command, process, stderr in processes:
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise BuildException("Processor '{0}' failed: {1}".format(
+                    command,
+                    stderr.read().strip() or
+                    'exit code {0}'.format(process.returncode)
+                ))
+    finally:
+        for command, process, stderr in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            stderr.close()
+
+
+class Builder(object):
+    """
+    Bundles builder.
+
+    Every bundle build is split into tasks: file lists resolving (depends on
+    resolving of excluded bundles), JS and CSS output (pre-processors,
+    concatenation, post-processors) and templates output (depends on shared
+    templates compilation task). Tasks are run by DAG scheduler.
+    """
+    config = None  # config object
+    jobs = None  # number of parallel jobs
+    templates = None  # templates compiler
+    scheduler = None  # tasks scheduler of last build
+    outputs = None  # dictionary of bundle name => list of written files
+    digests = None  # dictionary of written filename => SHA1 hex digest
+    changed = None  # list of output files changed by build
+    durations = None  # dictionary of bundle name => build duration
+    unbundled = None  # dictionary of bundle name => {ext: list of files}
+    pools = None  # dictionary of (kind, processor name) => workers pool
+    pack = None  # pack writer, every output is added to it
+    _pools_lock = None
+
+    def __init__(self, config, jobs=None, pack=None):
+        self.config = config
+        self.jobs = jobs
+        self.pack = pack
+        self.templates = TemplateCompiler(config, jobs=jobs)
+        self.scheduler = None
+        self.outputs = {}
+        self.digests = {}
+        self.changed = []
+        self.durations = {}
+        self.unbundled = {}
+        self.pools = {}
+        self._pools_lock = threading.Lock()
+
+    def processors(self, bundle):
+        """
+        Returns lists of bundle pre-processors and post-processors: shell
+        commands and persistent workers pools.
+        """
+        result = []
+        for kind, names, commands in (('pre', bundle.pre_processors,
+                                       self.config.pre_processors),
+                                      ('post', bundle.post_processors,
+                                       self.config.post_processors)):
+            processors = []
+            for name in names:
+                if name not in commands:
+                    raise BuildException(
+                        "Bundle '{0}' processor '{1}' is not defined".format(
+                            bundle.name, name
+                        )
+                    )
+                if isinstance(commands[name], dict):
+                    processors.append(self.worker_pool(kind, name,
+                                                       commands[name]))
+                else:
+                    processors.append(commands[name])
+            result.append(processors)
+        return result
+
+    def worker_pool(self, kind, name, params):
+        """
+        Returns persistent workers pool for processor.
+        """
+        with self._pools_lock:
+            key = (kind, name)
+            if key not in self.pools:
+                self.pools[key] = WorkerPool(
+                    params['worker'],
+                    size=params.get('workers') or self.jobs,
+                    timeout=params.get('timeout')
+                )
+            return self.pools[key]
+
+    def close(self):
+        """
+        Stop persistent workers.
+        """
+        with self._pools_lock:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools = {}
+
+    @staticmethod
+    def concat(files, pre_processors, output, ext):
+        """
+        Write pre-processed files into output, one by one.
+        """
+        for filename in files:
+            if pre_processors:
+                with open(filename, 'rb') as file_data:
+                    run_processors(pre_processors, file_data, output, ext)
+            else:
+                output.copy_file(filename)
+
+            if output.last_byte not in (None, b'\n'):
+                output.write(b'\n')
+
+    def write_output(self, bundle, filename, ext, fill, raw=False,
+                     hashed=False):
+        """
+        Write output file atomically, post-processing data written by `fill`
+        (if not `raw`), returns written filename.
+
+        Data for post-processors is spooled into temporary file, so memory
+        usage does not depend on bundle size. If `hashed`, filename is format
+        with '{0}' placeholder for content hash.
+        """
+        post_processors = [] if raw else self.processors(bundle)[1]
+
+        if hashed:
+            writer = HashedOutputWriter(filename)
+        else:
+            writer = OutputWriter(filename)
+
+        try:
+            with writer as output:
+                if post_processors:
+                    with tempfile.TemporaryFile() as spool:
+                        fill(StreamWriter(spool))
+                        spool.seek(0)
+                        run_processors(post_processors, spool, output, ext)
+                else:
+                    fill(output)
+        except (IOError, OSError) as exc:
+            raise BuildException(
+                "Error while writing file {0}: {1}".format(filename, exc)
+            )
+
+        self.digests[output.filename] = output.digest
+        if output.changed:
+            self.changed.append(output.filename)
+        self.add_to_pack(output.filename)
+        return output.filename
+
+    def add_to_pack(self, filename):
+        """
+        Add output file into pack (if pack output is enabled).
+        """
+        if self.pack is None:
+            return
+        try:
+            self.pack.add(filename)
+        except (IOError, OSError) as exc:
+            raise BuildException(
+                "Error while writing pack {0}: {1}".format(
+                    self.pack.filename, exc
+                )
+            )
+
+    def hashed_format(self, bundle, filename):
+        """
+        Returns content-hashed output filename format for module file.
+        """
+        rel_path = os.path.relpath(filename, self.config.root_dir)
+        parts = [
+            '__' if part == os.pardir else part
+            for part in rel_path.split(os.path.sep)
+        ]
+        stem, ext = os.path.splitext(os.path.join(*parts))
+        stem = stem.replace('{', '{{').replace('}', '}}')
+        return os.path.join(bundle.output_dir, 'modules', stem + '.{0}' + ext)
+
+    def link_hashed(self, bundle, filename):
+        """
+        Copy module file into content-hashed output file (or hard-link it,
+        if `hard_links` is enabled in config and possible), returns output
+        filename.
+
+        Hard-linked output shares content with module file, so module files
+        must be replaced on change, not rewritten in place. Existing output
+        is reused only if its (cached) digest matches module file digest,
+        otherwise it is replaced.
+        """
+        digest = self.config.file_hash(filename)[1]
+        output = hashed_name(self.hashed_format(bundle, filename), digest)
+
+        if not os.path.isfile(output) or \
+                self.config.file_hash(output)[1] != digest:
+            try:
+                make_dirs(os.path.dirname(output))
+                handle, temp_file = tempfile.mkstemp(
+                    dir=os.path.dirname(output),
+                    prefix='.{0}.'.format(os.path.basename(output)),
+                    suffix='.tmp'
+                )
+                os.close(handle)
+                try:
+                    linked = False
+                    if self.config.hard_links:
+                        os.unlink(temp_file)
+                        try:
+                            os.link(filename, temp_file)
+                            linked = True
+                        except (AttributeError, OSError):
+                            pass
+                    if not linked:
+                        shutil.copyfile(filename, temp_file)
+                        os.chmod(temp_file, 0o666 & ~UMASK)
+                    os.rename(temp_file, output)
+                finally:
+                    if os.path.exists(temp_file):
+                        os.unlink(temp_file)
+            except (IOError, OSError) as exc:
+                raise BuildException(
+                    "Error while writing file {0}: {1}".format(output, exc)
+                )
+            self.changed.append(output)
+
+        self.digests[output] = digest
+        self.add_to_pack(output)
+        return output
+
+    def build_unbundled(self, bundle, files, ext):
+        """
+        Build content-hashed output file for every bundle file, returns list
+        of written files in bundle order.
+        """
+        pre_processors, post_processors = self.processors(bundle)
+
+        outputs = []
+        for filename in files:
+            if pre_processors or post_processors:
+                outputs.append(self.write_output(
+                    bundle, self.hashed_format(bundle, filename), ext,
+                    partial(Builder.concat, [filename], pre_processors,
+                            ext=ext),
+                    hashed=True
+                ))
+            else:
+                outputs.append(self.link_hashed(bundle, filename))
+
+        self.unbundled.setdefault(bundle.name, {})[ext] = outputs
+        return outputs
+
+    def build_preload(self, bundle):
+        """
+        Build preload manifest and HTML snippet for unbundled bundle, returns
+        list of written files.
+        """
+        if bundle.output_mode != 'unbundled':
+            return []
+
+        files = self.unbundled.get(bundle.name, {})
+        manifest = {}
+        for ext in ('js', 'css'):
+            manifest[ext] = [
+                os.path.relpath(filename, bundle.output_dir).replace(
+                    os.path.sep, '/'
+                )
+                for filename in files.get(ext, [])
+            ]
+
+        lines = []
+        for url in manifest['css']:
+            lines.append('<link rel="preload" href="{0}" as="style">'.format(
+                url
+            ))
+        for url in manifest['js']:
+            lines.append('<link rel="preload" href="{0}" as="script">'.format(
+                url
+            ))
+        for url in manifest['css']:
+            lines.append('<link rel="stylesheet" href="{0}">'.format(url))
+        for url in manifest['js']:
+            lines.append('<script src="{0}"></script>'.format(url))
+
+        manifest_data = json.dumps(manifest, indent=2, sort_keys=True,
+                                   separators=(',', ': ')) + '\n'
+        html_data = '\n'.join(lines) + '\n'
+
+        return [
+            self.write_output(
+                bundle, bundle.output_file('preload.json'), 'json',
+                lambda output: output.write(manifest_data.encode()), raw=True
+            ),
+            self.write_output(
+                bundle, bundle.output_file('preload.html'), 'html',
+                lambda output: output.write(html_data.encode()), raw=True
+            ),
+        ]
+
+    def build_js(self, bundle):
+        """
+        Build bundle JS file, returns written filename (or list of written
+        files for unbundled or size-capped bundle).
+        """
+        if bundle.output_mode == 'unbundled':
+            return self.build_unbundled(bundle, bundle.js_files, 'js')
+
+        if bundle.max_size:
+            return self.build_parts(bundle)
+
+        if bundle.js_files:
+            pre_processors = self.processors(bundle)[0]
+            output = self.write_output(
+                bundle, bundle.output_file('js'), 'js',
+                partial(Builder.concat, bundle.js_files, pre_processors,
+                        ext='js')
+            )
+            # parts of previous build with `max_size`
+            Builder.remove_outputs(stale_parts(bundle))
+            return output
+
+    def build_parts(self, bundle):
+        """
+        Build size-capped bundle JS parts and parts manifest, returns list of
+        written files.
+
+        Outputs of previous build, which are not parts anymore (parts above
+        new parts count and whole bundle JS file), are removed after manifest
+        is written.
+        """
+        pre_processors = self.processors(bundle)[0]
+        parts = bundle_parts(bundle)
+
+        outputs = []
+        for part in parts:
+            outputs.append(self.write_output(
+                bundle, part.output_file, 'js',
+                partial(Builder.concat, part.js_files, pre_processors,
+                        ext='js')
+            ))
+
+        data = json.dumps(parts_manifest(parts), indent=2, sort_keys=True,
+                          separators=(',', ': ')) + '\n'
+        outputs.append(self.write_output(
+            bundle, bundle.output_file('parts.json'), 'json',
+            lambda output: output.write(data.encode()), raw=True
+        ))
+
+        Builder.remove_outputs(stale_parts(bundle, parts))
+        return outputs
+
+    @staticmethod
+    def remove_outputs(filenames):
+        """
+        Remove stale output files.
+        """
+        for filename in filenames:
+            try:
+                os.unlink(filename)
+            except OSError as exc:
+                raise BuildException(
+                    "Error while removing file {0}: {1}".format(filename, exc)
+                )
+
+    def build_css(self, bundle):
+        """
+        Build bundle CSS file, returns written filename (or list of written
+        files for unbundled bundle).
+        """
+        if bundle.output_mode == 'unbundled':
+            return self.build_unbundled(bundle, bundle.css_files, 'css')
+
+        if bundle.css_files:
+            pre_processors = self.processors(bundle)[0]
+            return self.write_output(
+                bundle, bundle.output_file('css'), 'css',
+                partial(Builder.concat, bundle.css_files, pre_processors,
+                        ext='css')
+            )
+
+    def build_templates(self, bundle):
+        """
+        Build bundle templates file, returns written filename.
+        """
+        if bundle.template_files:
+            return self.write_output(
+                bundle, bundle.output_file('templates.js'), 'js',
+                partial(self.templates.write_bundle, bundle)
+            )
+
+    def build_chunks(self, bundle):
+        """
+        Build bundle async modules chunks, chunks manifest and runtime loader,
+        returns list of written files.
+        """
+        if not bundle.async_modules:
+            return []
+
+        for module_name in bundle.async_modules:
+            if module_name not in self.config.modules:
+                raise BuildException(
+                    "Bundle '{0}' async module '{1}' is not defined".format(
+                        bundle.name, module_name
+                    )
+                )
+
+        pre_processors = self.processors(bundle)[0]
+        chunks = bundle_chunks(bundle)
+
+        outputs = []
+        for chunk in chunks:
+            outputs.append(self.write_output(
+                bundle, chunk.output_file, 'js',
+                partial(Builder.concat, chunk.js_files, pre_processors,
+                        ext='js')
+            ))
+
+        manifest = chunks_manifest(bundle, chunks)
+
+        data = json.dumps(manifest, indent=2, sort_keys=True,
+                          separators=(',', ': ')) + '\n'
+        outputs.append(self.write_output(
+            bundle, bundle.output_file('chunks.json'), 'json',
+            lambda output: output.write(data.encode()), raw=True
+        ))
+
+        outputs.append(self.write_output(
+            bundle, bundle.output_file('loader.js'), 'js',
+            lambda output: output.write(loader_script(manifest).encode())
+        ))
+
+        return outputs
+
+    def build_bundle(self, bundle):
+        """
+        Build bundle files, returns list of written files.
+        """
+        outputs = []
+        for result in (self.build_js(bundle), self.build_css(bundle),
+                       self.build_templates(bundle), self.build_chunks(bundle),
+                       self.build_preload(bundle)):
+            if isinstance(result, list):
+                outputs.extend(result)
+            elif result:
+                outputs.append(result)
+        return outputs
+
+    def compile_templates(self, bundles):
+        """
+        Compile templates of all bundles at once to load process pool.
+        """
+        template_files = []
+        for bundle in bundles:
+            template_files.extend(bundle.template_files)
+        self.templates.compile(template_files)
+
+    @staticmethod
+    def resolve(bundle):
+        """
+        Resolve bundle files lists.
+        """
+        bundle.js_files
+        bundle.css_files
+        bundle.template_files
+
+    @staticmethod
+    def estimate(files, processes, history, name):
+        """
+        Returns estimated task duration: recorded one or guessed from input
+        files size and number of processes to spawn.
+        """
+        if isinstance(history.get(name), (int, float)):
+            return float(history[name])
+
+        size = 0
+        for filename in files:
+            try:
+                size += os.path.getsize(filename)
+            except OSError:
+                pass
+        return size * BYTE_COST + processes * SPAWN_COST
+
+    def tasks(self, bundles):
+        """
+        Returns list of build tasks for bundles.
+        """
+        history = read_durations(self.config, 'tasks')
+        tasks = []
+
+        # excluded bundles are read through modules files lists only, so
+        # bundles are resolved independently
+        for bundle in bundles:
+            for exclude_name in bundle.exclude:
+                if exclude_name not in self.config.bundles:
+                    raise BuildException(
+                        "Bundle '{0}' excludes unknown bundle '{1}'".format(
+                            bundle.name, exclude_name
+                        )
+                    )
+
+            tasks.append(Task(
+                name='resolve:{0}'.format(bundle.name),
+                func=partial(Builder.resolve, bundle),
+                estimate=RESOLVE_COST
+            ))
+
+        template_files = []
+        for bundle in bundles:
+            template_files.extend(bundle.all_template_files)
+        tasks.append(Task(
+            name='templates',
+            func=partial(self.compile_templates, bundles),
+            deps=['resolve:{0}'.format(bundle.name) for bundle in bundles],
+            estimate=Builder.estimate(
+                [], len(set(template_files)), history, 'templates'
+            ) / self.templates.jobs
+        ))
+
+        for bundle in bundles:
+            pre_processors, post_processors = self.processors(bundle)
+            resolve_name = 'resolve:{0}'.format(bundle.name)
+
+            for stage, files, func in (
+                ('js', bundle.all_js_files, self.build_js),
+                ('css', bundle.all_css_files, self.build_css),
+            ):
+                name = '{0}:{1}'.format(stage, bundle.name)
+                processes = len(set(files)) * len(pre_processors)
+                if files:
+                    processes += len(post_processors)
+                tasks.append(Task(
+                    name=name,
+                    func=partial(func, bundle),
+                    deps=[resolve_name],
+                    estimate=Builder.estimate(files, processes, history, name)
+                ))
+
+            name = 'templates:{0}'.format(bundle.name)
+            files = bundle.all_template_files
+            tasks.append(Task(
+                name=name,
+                func=partial(self.build_templates, bundle),
+                deps=[resolve_name, 'templates'],
+                estimate=Builder.estimate(
+                    files, len(post_processors) if files else 0, history, name
+                )
+            ))
+
+            name = 'preload:{0}'.format(bundle.name)
+            tasks.append(Task(
+                name=name,
+                func=partial(self.build_preload, bundle),
+                deps=['js:{0}'.format(bundle.name),
+                      'css:{0}'.format(bundle.name)],
+                estimate=RESOLVE_COST
+            ))
+
+            name = 'chunks:{0}'.format(bundle.name)
+            files = []
+            for module_name in bundle.async_modules:
+                module = self.config.modules.get(module_name)
+                if module is not None:
+                    files.extend(module.js_files_list)
+            processes = len(set(files)) * len(pre_processors)
+            if files:
+                processes += len(post_processors) * len(bundle.async_modules)
+            tasks.append(Task(
+                name=name,
+                func=partial(self.build_chunks, bundle),
+                deps=[resolve_name],
+                estimate=Builder.estimate(files, processes, history, name)
+            ))
+
+        return tasks
+
+    def build(self, bundle_names=None):
+        """
+        Build bundles (all bundles by default), returns list of written files.
+
+        After build of all bundles, cached compiled templates which are not
+        used anymore are removed.
+        """
+        build_all = bundle_names is None
+        if build_all:
+            bundle_names = sorted(self.config.bundles.keys())
+
+        for name in bundle_names:
+            if name not in self.config.bundles:
+                raise BuildException(
+                    "Bundle '{0}' is not defined".format(name)
+                )
+
+        bundles = [self.config.bundles[name] for name in bundle_names]
+
+        self.scheduler = Scheduler(self.tasks(bundles), jobs=self.jobs)
+        try:
+            results = self.scheduler.run()
+        finally:
+            self.close()
+            write_durations(self.config, dict(
+                (task.name, task.duration)
+                for task in self.scheduler.tasks.values()
+                if task.duration is not None
+            ), 'tasks')
+
+        outputs = []
+        for bundle in bundles:
+            self.outputs[bundle.name] = []
+            self.durations[bundle.name] = 0.0
+            for stage in ('resolve', 'js', 'css', 'templates', 'chunks',
+                          'preload'):
+                name = '{0}:{1}'.format(stage, bundle.name)
+                if isinstance(results[name], list):
+                    self.outputs[bundle.name].extend(results[name])
+                elif results[name]:
+                    self.outputs[bundle.name].append(results[name])
+                self.durations[bundle.name] += \
+                    self.scheduler.tasks[name].duration
+            outputs.extend(self.outputs[bundle.name])
+
+        if build_all:
+            self.templates.prune()
+        return outputs
@@ -3,6 +3,13 @@ Bundle implementation.
 """
 
 
+# bundle size budgets: raw and gzip-compressed sizes of JS and CSS files
+BUDGET_KINDS = ('js', 'js_gzip', 'css', 'css_gzip')
+
+# bundle output modes: one file per type or content-hashed file per module file
+OUTPUT_MODES = ('bundle', 'unbundled')
+
+
 def deduplicate(seq):
     seen = set()
     return [x for x in seq if not (x in seen or seen.add(x))]
@@ -25,19 +32,28 @@ class Bundle(object):
     exclude = None  # list of modules we need to exclude from out bundle
     pre_processors = None  # list of bundle pre-processors
     post_processors = None  # list of bundle post-processors
+    budget = None  # dictionary of bundle size budgets
+    async_modules = None  # list of modules, loaded on demand in chunks
+    output_mode = None  # output mode, one of `OUTPUT_MODES`
+    max_size = None  # maximum size of JS file part in bytes
     config = None  # config object
 
     _js_files = None
     _css_files = None
+    _template_files = None
     _js_excluded = None
     _css_excluded = None
+    _template_excluded = None
 
     def __init__(self, name, modules, output_dir, exclude, pre_processors,
-                 post_processors, config):
+                 post_processors, config, budget=None, async_modules=None,
+                 output_mode=None, max_size=None):
         self._js_files = None
         self._css_files = None
+        self._template_files = None
         self._js_excluded = None
         self._css_excluded = None
+        self._template_excluded = None
 
         self.name = name
         self.modules = modules or []
@@ -45,6 +61,10 @@ class Bundle(object):
         self.exclude = exclude or []
         self.pre_processors = pre_processors or []
         self.post_processors = post_processors or []
+        self.budget = budget or {}
+        self.async_modules = async_modules or []
+        self.output_mode = output_mode or 'bundle'
+        self.max_size = max_size
         self.config = config
 
     def output_file(self, ext):
@@ -67,12 +87,52 @@ class Bundle(object):
     def all_css_files(self):
         """
         Returns list of CSS files (deduplicated and even excluded).
+
+        CSS files of async modules are not loaded in chunks, so they are
+        included here too.
         """
         css_files = []
-        for module_name in self.modules:
+        for module_name in self.modules + self.async_modules:
             css_files.extend(self.config.modules[module_name].css_files_list)
         return css_files
 
+    @property
+    def all_template_files(self):
+        """
+        Returns list of template files (deduplicated and even excluded).
+
+        Templates of async modules are included here too.
+        """
+        template_files = []
+        for module_name in self.modules + self.async_modules:
+            module = self.config.modules[module_name]
+            template_files.extend(module.template_files_list)
+        return template_files
+
+    def content_duplicates(self, files, excluded_files):
+        """
+        Returns set of files with same content as previous file in list or
+        as one of excluded files (only if content deduplication is enabled).
+        """
+        duplicates = set()
+        if not self.config.deduplicate_content:
+            return duplicates
+
+        seen = set()
+        for filename in excluded_files:
+            seen.add(self.config.file_hash(filename))
+
+        for filename in files:
+            if filename in excluded_files:
+                continue
+            file_hash = self.config.file_hash(filename)
+            if file_hash in seen:
+                duplicates.add(filename)
+            else:
+                seen.add(file_hash)
+
+        return duplicates
+
     @property
     def js_files(self):
         """
@@ -81,21 +141,27 @@ class Bundle(object):
         if self._js_files is not None:
             return self._js_files
 
-        self._js_files = []
-        self._js_excluded = []
+        files = []
+        excluded = []
 
-        for js_file in deduplicate(self.all_js_files):
-            excluded_files = set()
+        excluded_files = set()
+        for exclude_name in self.exclude:
+            excludes = self.config.bundles[exclude_name].all_js_files
+            excluded_files.update(excludes)
 
-            for exclude_name in self.exclude:
-                excludes = self.config.bundles[exclude_name].all_js_files
-                excluded_files.update(excludes)
+        js_files = deduplicate(self.all_js_files)
+        excluded_files.update(self.content_duplicates(js_files,
+                                                      excluded_files))
 
+        for js_file in js_files:
             if js_file in excluded_files:
-                self._js_excluded.append(js_file)
+                excluded.append(js_file)
             else:
-                self._js_files.append(js_file)
+                files.append(js_file)
 
+        # lists are cached only when complete: they are read from threads
+        self._js_excluded = excluded
+        self._js_files = files
         return self._js_files
 
     @property
@@ -106,24 +172,54 @@ class Bundle(object):
         if self._css_files is not None:
             return self._css_files
 
-        self._css_files = []
-        self._css_excluded = []
+        files = []
+        excluded = []
 
-        for css_file in deduplicate(self.all_css_files):
+        excluded_files = set()
+        for exclude_name in self.exclude:
+            excludes = self.config.bundles[exclude_name].all_css_files
+            excluded_files.update(excludes)
 
-            excluded_files = set()
-
-            for exclude_name in self.exclude:
-                excludes = self.config.bundles[exclude_name].all_css_files
-                excluded_files.update(excludes)
+        css_files = deduplicate(self.all_css_files)
+        excluded_files.update(self.content_duplicates(css_files,
+                                                      excluded_files))
 
+        for css_file in css_files:
             if css_file in excluded_files:
-                self._css_excluded.append(css_file)
+                excluded.append(css_file)
             else:
-                self._css_files.append(css_file)
+                files.append(css_file)
 
+        self._css_excluded = excluded
+        self._css_files = files
         return self._css_files
 
+    @property
+    def template_files(self):
+        """
+        Returns list of template files.
+        """
+        if self._template_files is not None:
+            return self._template_files
+
+        files = []
+        excluded = []
+
+        excluded_files = set()
+        for exclude_name in self.exclude:
+            excludes = self.config.bundles[exclude_name].all_template_files
+            excluded_files.update(excludes)
+
+        for template_file in deduplicate(self.all_template_files):
+            if template_file in excluded_files:
+                excluded.append(template_file)
+            else:
+                files.append(template_file)
+
+        self._template_excluded = excluded
+        self._template_files = files
+        return self._template_files
+
     @property
     def js_excluded(self):
         """
@@ -141,3 +237,12 @@ class Bundle(object):
         if self._css_excluded is None:
             self.css_files
         return self._css_excluded
+
+    @property
+    def template_excluded(self):
+        """
+        Returns list of excluded template files.
+        """
+        if self._template_excluded is None:
+            self.template_files
+        return self._template_excluded
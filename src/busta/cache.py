@@ -0,0 +1,91 @@
+"""
+Per-file values cache.
+"""
+import json
+import os
+
+
+class FileCache(object):
+    """
+    Cache of values computed from file content, keyed by (size, mtime).
+
+    Cache is stored as JSON file `<cache_dir>/<name>.json`.
+    """
+    name = None  # cache name
+    compute = None  # function, returns value for filename
+    cache_dir = None  # cache directory
+    values = None  # dictionary of filename => [size, mtime, value]
+    changed = False  # `True` if cache must be saved
+
+    def __init__(self, name, compute, cache_dir):
+        self.name = name
+        self.compute = compute
+        self.cache_dir = cache_dir
+        self.values = {}
+        self.changed = False
+
+        try:
+            with open(self.cache_file) as file_data:
+                values = json.load(file_data)
+            if isinstance(values, dict):
+                self.values = values
+        except (IOError, OSError, ValueError):
+            pass
+
+    @property
+    def cache_file(self):
+        """
+        Returns cache filename.
+        """
+        return os.path.join(self.cache_dir, '{0}.json'.format(self.name))
+
+    def get(self, filename):
+        """
+        Returns (file size, value) tuple for file.
+        """
+        stat = os.stat(filename)
+
+        cached = self.values.get(filename)
+        if cached and cached[0] == stat.st_size and \
+                cached[1] == stat.st_mtime:
+            return cached[0], cached[2]
+
+        value = self.compute(filename)
+        self.values[filename] = [stat.st_size, stat.st_mtime, value]
+        self.changed = True
+        return stat.st_size, value
+
+    def get_files(self, key, filenames, compute):
+        """
+        Returns value computed by `compute(filenames)` from several files,
+        cached under key while all files keep their sizes and mtimes.
+        """
+        stamps = []
+        for filename in filenames:
+            stat = os.stat(filename)
+            stamps.append([filename, stat.st_size, stat.st_mtime])
+
+        cached = self.values.get(key)
+        if cached and cached[0] == stamps:
+            return cached[1]
+
+        value = compute(filenames)
+        self.values[key] = [stamps, value]
+        self.changed = True
+        return value
+
+    def save(self):
+        """
+        Save cache, if changed.
+        """
+        if not self.changed:
+            return
+
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        temp_file = '{0}.{1}.tmp'.format(self.cache_file, os.getpid())
+        with open(temp_file, 'w') as file_data:
+            json.dump(self.values, file_data)
+        os.rename(temp_file, self.cache_file)
+        self.changed = False
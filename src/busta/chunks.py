@@ -0,0 +1,175 @@
+"""
+Lazy-loading chunks for bundle async modules.
+"""
+import json
+import os
+import re
+
+from busta.bundle import deduplicate
+
+
+LOADER_JS = """(function (window, document) {
+    var manifest = %(manifest)s;
+    var scripts = document.getElementsByTagName('script');
+    var current = document.currentScript || scripts[scripts.length - 1];
+    var base = current.src.replace(/[^\\/]*$/, '');
+    var busta = window.busta = window.busta || {};
+    var entries = busta.entries = busta.entries || {};
+
+    // every bundle loader adds its entries, chunks URLs are resolved
+    // against its own location
+    for (var name in manifest.entries) {
+        if (manifest.entries.hasOwnProperty(name)) {
+            var urls = [];
+            for (var i = 0; i < manifest.entries[name].length; i++) {
+                urls.push(base + manifest.entries[name][i]);
+            }
+            entries[name] = urls;
+        }
+    }
+
+    if (busta.load) {
+        return;
+    }
+
+    var chunks = {};
+
+    function loadChunk(src, callback) {
+        if (chunks[src] === true) {
+            return callback();
+        }
+        if (chunks[src]) {
+            return chunks[src].push(callback);
+        }
+        chunks[src] = [callback];
+
+        var script = document.createElement('script');
+        script.async = true;
+        script.src = src;
+        script.onload = script.onerror = function (event) {
+            var callbacks = chunks[src];
+            var error = null;
+            script.onload = script.onerror = null;
+            if (event && event.type === 'error') {
+                error = new Error('Chunk loading failed: ' + src);
+                delete chunks[src];
+            } else {
+                chunks[src] = true;
+            }
+            for (var i = 0; i < callbacks.length; i++) {
+                callbacks[i](error);
+            }
+        };
+        document.getElementsByTagName('head')[0].appendChild(script);
+    }
+
+    function load(name, callback) {
+        var files = entries[name];
+        var i = 0;
+        if (!files) {
+            throw new Error('Unknown async module: ' + name);
+        }
+        (function next(error) {
+            if (error || i >= files.length) {
+                return callback && callback(error || null);
+            }
+            loadChunk(files[i++], next);
+        })();
+    }
+
+    busta.load = load;
+})(window, document);
+"""
+
+
+class Chunk(object):
+    """
+    Chunk object: JS files needed by same set of bundle async modules.
+    """
+    bundle = None  # bundle object
+    entries = None  # sorted list of async modules names, needing this chunk
+    js_files = None  # list of chunk JS files
+
+    def __init__(self, bundle, entries):
+        self.bundle = bundle
+        self.entries = sorted(entries)
+        self.js_files = []
+
+    @property
+    def name(self):
+        """
+        Returns chunk name.
+        """
+        return re.sub(r'[^\w.~-]', '_', '~'.join(self.entries))
+
+    @property
+    def output_file(self):
+        """
+        Returns chunk output filename.
+        """
+        return self.bundle.output_file('chunk.{0}.js'.format(self.name))
+
+
+def bundle_chunks(bundle):
+    """
+    Returns list of bundle chunks in loading order.
+
+    Every async module JS file (with dependencies), which is not already in
+    bundle or its excluded bundles, goes to the chunk of all async modules
+    needing this file. File dependencies are needed by superset of modules,
+    so chunks needed by more modules are loaded first.
+    """
+    loaded = set(bundle.js_files)
+    loaded.update(bundle.js_excluded)
+    for exclude_name in bundle.exclude:
+        loaded.update(bundle.config.bundles[exclude_name].all_js_files)
+
+    needs = {}
+    order = []
+    for module_name in bundle.async_modules:
+        module = bundle.config.modules[module_name]
+        for js_file in deduplicate(module.js_files_list):
+            if js_file in loaded:
+                continue
+            if js_file not in needs:
+                needs[js_file] = set()
+                order.append(js_file)
+            needs[js_file].add(module_name)
+
+    chunks = {}
+    first = {}
+    for index, js_file in enumerate(order):
+        key = frozenset(needs[js_file])
+        if key not in chunks:
+            chunks[key] = Chunk(bundle, key)
+            first[key] = index
+        chunks[key].js_files.append(js_file)
+
+    return [
+        chunks[key] for key in sorted(
+            chunks, key=lambda key: (-len(key), first[key])
+        )
+    ]
+
+
+def chunks_manifest(bundle, chunks):
+    """
+    Returns chunks manifest: async module name => list of chunks files to
+    load in order.
+    """
+    entries = {}
+    for module_name in bundle.async_modules:
+        entries[module_name] = [
+            os.path.basename(chunk.output_file) for chunk in chunks
+            if module_name in chunk.entries
+        ]
+    return {'entries': entries}
+
+
+def loader_script(manifest):
+    """
+    Returns runtime loader script with inlined chunks manifest.
+    """
+    return LOADER_JS % {
+        'manifest': json.dumps(manifest, sort_keys=True),
+    }
@@ -2,6 +2,8 @@
 # coding: utf-8
 from __future__ import print_function
 import argparse
+import json
+import os
 import sys
 
 from busta.config import Config
@@ -13,15 +15,72 @@ DRAW_FROM = u'┬── '
 DRAW_SKIP = u'│   '
 DRAW_NEXT = u'├── '
 DRAW_LAST = u'└── '
+DRAW_SEEN = u' (*)'  # marker of already expanded dependencies subtree
 
 FONT_UNDERLINE = '\033[4m'
 FONT_BOLD = '\033[1m'
 FONT_OFF = '\033[0m'
 
+OUTPUT_FORMATS = ('text', 'json')
+OUTPUT_BUFFER_SIZE = 65536  # size of buffered output before flush
 
-def print_js_dependencies(module, levels=None, padding=0):
+
+class TextOutput(object):
+    """
+    Buffered text output: lines are collected and written to binary stream
+    in big encoded chunks.
+    """
+    stream = None  # binary output stream
+    encoding = None  # output encoding
+    chunks = None  # list of buffered text chunks
+    size = None  # size of buffered text
+
+    def __init__(self, stream=None):
+        self.stream = stream or getattr(sys.stdout, 'buffer', sys.stdout)
+        self.encoding = getattr(sys.stdout, 'encoding', None) or 'utf-8'
+        self.chunks = []
+        self.size = 0
+
+    def write(self, text):
+        """
+        Write text chunk.
+        """
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size >= OUTPUT_BUFFER_SIZE:
+            self.flush()
+
+    def line(self, text=''):
+        """
+        Write text line.
+        """
+        self.write(text)
+        self.write('\n')
+
+    def flush(self):
+        """
+        Write buffered text to stream.
+        """
+        if self.chunks:
+            self.stream.write(
+                ''.join(self.chunks).encode(self.encoding, 'replace')
+            )
+            self.chunks = []
+            self.size = 0
+        self.stream.flush()
+
+
+def print_js_dependencies(module, out, expanded, levels=None, padding=0):
     """
     Print module JS dependencies recursively.
+
+    Every dependency subtree is expanded once, next occurrences are marked
+    with reference marker, so output size depends on number of unique
+    modules, not on number of dependency paths.
+
+    :param expanded: set of already expanded modules names
     """
     if not module.js_dependencies:
         return
@@ -45,32 +104,40 @@ def print_js_dependencies(module, levels=None, padding=0):
             prefix = spaces + DRAW_NEXT
 
         dependency = module.config.modules[module_name]
-        print(prefix + dependency.js_human_name)
+        if dependency.js_dependencies and module_name in expanded:
+            out.line(prefix + dependency.js_human_name + DRAW_SEEN)
+            continue
+        out.line(prefix + dependency.js_human_name)
 
         if dependency.js_dependencies:
+            expanded.add(module_name)
             new_levels = levels + [is_last]
-            print_js_dependencies(dependency, new_levels, padding=padding)
+            print_js_dependencies(dependency, out, expanded, new_levels,
+                                  padding=padding)
 
 
-def print_modules_list(config, verbosity):
+def print_modules_list(config, verbosity, out):
     """
     Print modules list from config.
     """
     if not config.modules:
-        print("No modules defined")
+        out.line("No modules defined")
         return
 
     if verbosity >= 3:
         root_len = len(config.root_dir)
+        expanded = set()
 
         for module_name in sorted(config.modules.keys()):
             module = config.modules[module_name]
-            print('\nModule "{0}":'.format(FONT_BOLD + module_name + FONT_OFF))
+            out.line('\nModule "{0}":'.format(
+                FONT_BOLD + module_name + FONT_OFF
+            ))
 
             if module.js_file:
                 filename = module.js_human_name
-                print(u'    JS {0}{1}'.format(DRAW_ONLY, filename))
-                print_js_dependencies(module, padding=11)
+                out.line(u'    JS {0}{1}'.format(DRAW_ONLY, filename))
+                print_js_dependencies(module, out, expanded, padding=11)
 
             if module.css_files:
                 count_i = len(module.css_files)
@@ -87,10 +154,27 @@ def print_modules_list(config, verbosity):
                             prefix += DRAW_LAST
                         else:
                             prefix += DRAW_NEXT
-                    print(prefix + css_file[root_len:])
+                    out.line(prefix + css_file[root_len:])
+
+            if module.template_files:
+                count_i = len(module.template_files)
+                for i, template_file in enumerate(module.template_files):
+                    if i == 0:
+                        prefix = '   TPL '
+                        if count_i == 1:
+                            prefix += DRAW_ONLY
+                        else:
+                            prefix += DRAW_FROM
+                    else:
+                        prefix = ' ' * 7
+                        if i == count_i - 1:
+                            prefix += DRAW_LAST
+                        else:
+                            prefix += DRAW_NEXT
+                    out.line(prefix + template_file[root_len:])
 
     else:
-        print("Modules:")
+        out.line("Modules:")
 
         max_length = 0
         for module_name in config.modules.keys():
@@ -101,15 +185,15 @@ def print_modules_list(config, verbosity):
         for module_name in sorted(config.modules.keys()):
             module = config.modules[module_name]
             module_name = '"' + module_name + '"'
-            print('  ' + str_format.format(module_name, module.human_name))
+            out.line('  ' + str_format.format(module_name, module.human_name))
 
 
-def print_bundles_list(config, verbosity):
+def print_bundles_list(config, verbosity, out):
     """
     Print bundles list from config.
     """
     if not config.bundles:
-        print("No bundles defined")
+        out.line("No bundles defined")
         return
 
     root_len = len(config.root_dir)
@@ -117,7 +201,7 @@ def print_bundles_list(config, verbosity):
         for bundle_name in sorted(config.bundles.keys()):
             bundle = config.bundles[bundle_name]
 
-            print('\nBundle "{0}"'.format(
+            out.line('\nBundle "{0}"'.format(
                 FONT_UNDERLINE + bundle_name + FONT_OFF
             ))
 
@@ -135,8 +219,8 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                print(prefix + '"' + FONT_BOLD + module_name
-                      + FONT_OFF + '"')
+                out.line(prefix + '"' + FONT_BOLD + module_name
+                         + FONT_OFF + '"')
 
             count_i = len(bundle.exclude)
             for i, exclude_name in enumerate(bundle.exclude):
@@ -152,8 +236,8 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                print(prefix + '"' + FONT_UNDERLINE + exclude_name
-                      + FONT_OFF + '"')
+                out.line(prefix + '"' + FONT_UNDERLINE + exclude_name
+                         + FONT_OFF + '"')
 
             if bundle.js_files:
                 filename = bundle.output_file('js')[root_len:]
@@ -162,7 +246,7 @@ def print_bundles_list(config, verbosity):
                     prefix += DRAW_FROM
                 else:
                     prefix += DRAW_ONLY
-                print(prefix + filename)
+                out.line(prefix + filename)
 
                 count_i = len(bundle.js_files)
                 for i, js_file in enumerate(bundle.js_files):
@@ -174,7 +258,7 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                    print(' ' * 10 + prefix + js_file[root_len:])
+                    out.line(' ' * 10 + prefix + js_file[root_len:])
 
             if bundle.css_files:
                 filename = bundle.output_file('css')[root_len:]
@@ -186,7 +270,7 @@ def print_bundles_list(config, verbosity):
                     prefix += DRAW_LAST
                 else:
                     prefix += DRAW_ONLY
-                print(prefix + filename)
+                out.line(prefix + filename)
 
                 for i, css_file in enumerate(bundle.css_files):
                     prefix = DRAW_NONE
@@ -194,12 +278,12 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                    print(' ' * 10 + prefix + css_file[root_len:])
+                    out.line(' ' * 10 + prefix + css_file[root_len:])
     elif verbosity >= 2:
         for bundle_name in sorted(config.bundles.keys()):
             bundle = config.bundles[bundle_name]
 
-            print('\nBundle "{0}"'.format(
+            out.line('\nBundle "{0}"'.format(
                 FONT_UNDERLINE + bundle_name + FONT_OFF
             ))
             count_i = len(bundle.modules)
@@ -216,7 +300,7 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                print(prefix + '"' + module_name + '"')
+                out.line(prefix + '"' + module_name + '"')
 
             count_i = len(bundle.exclude)
             for i, exclude_name in enumerate(bundle.exclude):
@@ -232,8 +316,8 @@ def print_bundles_list(config, verbosity):
                         prefix += DRAW_LAST
                     else:
                         prefix += DRAW_NEXT
-                print(prefix + '"' + FONT_UNDERLINE + exclude_name
-                      + FONT_OFF + '"')
+                out.line(prefix + '"' + FONT_UNDERLINE + exclude_name
+                         + FONT_OFF + '"')
 
             if bundle.js_files:
                 filename = bundle.output_file('js')[root_len:]
@@ -242,7 +326,7 @@ def print_bundles_list(config, verbosity):
                     prefix += DRAW_FROM
                 else:
                     prefix += DRAW_ONLY
-                print(prefix + filename)
+                out.line(prefix + filename)
 
             if bundle.css_files:
                 filename = bundle.output_file('css')[root_len:]
@@ -254,7 +338,7 @@ def print_bundles_list(config, verbosity):
                     prefix += DRAW_LAST
                 else:
                     prefix += DRAW_ONLY
-                print(prefix + filename)
+                out.line(prefix + filename)
     elif verbosity >= 1:
         bundles_files = []
         for bundle_name in sorted(config.bundles.keys()):
@@ -271,42 +355,534 @@ def print_bundles_list(config, verbosity):
                 prefix = 'Bundles output:   '
             else:
                 prefix = '                  '
-            print(prefix + bundle_file)
+            out.line(prefix + bundle_file)
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Build static bundles')
+def write_json_list(config, out):
+    """
+    Write config, modules and bundles info as JSON, entry by entry.
+    """
+    def rel_path(filename):
+        return os.path.relpath(filename, config.root_dir)
+
+    out.write('{{"config_file": {0}, "root_dir": {1}, "output_dir": {2}'
+              .format(json.dumps(config.config_file),
+                      json.dumps(config.root_dir),
+                      json.dumps(config.output_dir)))
+
+    out.write(', "modules": {')
+    for i, module_name in enumerate(sorted(config.modules.keys())):
+        module = config.modules[module_name]
+        out.write('{0}\n{1}: {2}'.format(
+            ',' if i else '', json.dumps(module_name), json.dumps({
+                'path': module.rel_path,
+                'js_file': module.js_file and rel_path(module.js_file),
+                'css_files': [rel_path(f) for f in module.css_files],
+                'template_files': [rel_path(f) for f in module.template_files],
+                'js_dependencies': module.js_dependencies,
+            }, sort_keys=True)
+        ))
+    out.write('}')
+
+    out.write(', "bundles": {')
+    for i, bundle_name in enumerate(sorted(config.bundles.keys())):
+        bundle = config.bundles[bundle_name]
+        outputs = {}
+        if bundle.js_files:
+            outputs['js'] = bundle.output_file('js')
+        if bundle.css_files:
+            outputs['css'] = bundle.output_file('css')
+        out.write('{0}\n{1}: {2}'.format(
+            ',' if i else '', json.dumps(bundle_name), json.dumps({
+                'modules': bundle.modules,
+                'exclude': bundle.exclude,
+                'async': bundle.async_modules,
+                'outputs': outputs,
+                'js_files': [rel_path(f) for f in bundle.js_files],
+                'css_files': [rel_path(f) for f in bundle.css_files],
+                'template_files': [rel_path(f) for f in bundle.template_files],
+            }, sort_keys=True)
+        ))
+    out.line('}}')
+
+
+def load_config(filename):
+    """
+    Load config or exit with error.
+    """
+    try:
+        return Config(filename)
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+
+def build_command(args):
+    """
+    Build bundles.
+    """
+    from busta.build import Builder
+    from busta.manifest import build_manifest, write_manifest
+    from busta.pack import PackWriter
+    from busta.shard import shard_bundles, write_durations
+
+    parser = argparse.ArgumentParser(prog='busta build',
+                                     description='Build static bundles')
     parser.add_argument('config', metavar='[config_file]',
                         help='bundles config filename')
+    parser.add_argument('bundles', metavar='bundle', nargs='*',
+                        help='bundles to build (default: all bundles)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of parallel jobs')
+    parser.add_argument('--shard', metavar='i/n', default=None,
+                        help='build only i-th of n bundles shards')
+    parser.add_argument('--shard-durations', metavar='[durations_file]',
+                        default=None,
+                        help='bundles durations file shared by all shards '
+                             '(default: split by input files sizes)')
+    parser.add_argument('--manifest', metavar='[manifest_file]',
+                        default=None, help='write build manifest to file')
+    parser.add_argument('--pack', metavar='[pack_file]', default=None,
+                        help='write all outputs into indexed pack file')
     parser.add_argument('-v', action='count', default=0, dest='verbosity',
                         help='verbosity level')
-    options = parser.parse_args()
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
 
     try:
-        config = Config(options.config)
+        bundles = options.bundles or None
+        if options.shard:
+            if bundles:
+                parser.error("bundles list can't be used with --shard")
+            bundles = shard_bundles(config, options.shard,
+                                    options.shard_durations)
+        elif options.shard_durations:
+            parser.error("--shard-durations can be used only with --shard")
+
+        if options.pack:
+            with PackWriter(options.pack) as pack:
+                builder = Builder(config, jobs=options.jobs, pack=pack)
+                outputs = builder.build(bundles)
+        else:
+            builder = Builder(config, jobs=options.jobs)
+            outputs = builder.build(bundles)
+        write_durations(config, builder.durations)
+        config.save_caches()
+
+        if options.manifest:
+            manifest = build_manifest(config, builder.outputs,
+                                      builder.digests, builder.durations)
+            write_manifest(options.manifest, manifest)
     except Exception as exc:
         print("Error: {0}".format(exc))
         sys.exit(1)
 
     if options.verbosity >= 1:
-        print("Config file:      {0}".format(config.config_file))
-        if options.verbosity >= 3:
-            print()
+        for i, output in enumerate(outputs):
+            if i == 0:
+                prefix = 'Bundles output:   '
+            else:
+                prefix = '                  '
+            print(prefix + output)
 
-    if options.verbosity >= 1:
-        print("Root directory:   {0}".format(config.root_dir))
-        if options.verbosity >= 3:
-            print()
+    if options.verbosity >= 2:
+        print()
+        for line in builder.scheduler.summary():
+            print(line)
 
-    if options.verbosity >= 1 and config.output_dir:
-        print("Output directory: {0}".format(config.output_dir))
-        if options.verbosity >= 2:
-            print()
 
-    if options.verbosity >= 2:
-        print_modules_list(config, options.verbosity)
-        if options.verbosity >= 3:
-            print()
+def print_bundle_size(report, root_len, top):
+    """
+    Print bundle size report.
+    """
+    from busta.size import format_size
+
+    print('\nBundle "{0}"'.format(
+        FONT_UNDERLINE + report.bundle.name + FONT_OFF
+    ))
+
+    for ext in ('js', 'css'):
+        if not report.sizes[ext]:
+            continue
+        line = u'  {0: >7} {1}{2: >10} raw {3: >10} gzip'.format(
+            ext.upper(), DRAW_ONLY,
+            format_size(report.sizes[ext]),
+            format_size(report.sizes[ext + '_gzip'])
+        )
+        budgets = [
+            '{0} {1}'.format(kind, format_size(report.bundle.budget[kind]))
+            for kind in (ext, ext + '_gzip') if kind in report.bundle.budget
+        ]
+        if budgets:
+            line += u'  (budget: {0})'.format(', '.join(budgets))
+        print(line)
+
+    for title, items in (('Files', report.files[:top]),
+                         ('Modules', report.modules[:top])):
+        count_i = len(items)
+        for i, (name, size, compressed) in enumerate(items):
+            if i == 0:
+                prefix = u'  {0: >7} '.format(title)
+                if count_i == 1:
+                    prefix += DRAW_ONLY
+                else:
+                    prefix += DRAW_FROM
+            else:
+                prefix = ' ' * 10
+                if i == count_i - 1:
+                    prefix += DRAW_LAST
+                else:
+                    prefix += DRAW_NEXT
+            if title == 'Files':
+                name = name[root_len:]
+            else:
+                name = '"' + FONT_BOLD + name + FONT_OFF + '"'
+            print(u'{0}{1: >10} {2: >10}  {3}'.format(
+                prefix, format_size(size), format_size(compressed), name
+            ))
 
-    if options.verbosity >= 1:
-        print_bundles_list(config, options.verbosity)
+
+def size_command(args):
+    """
+    Print bundles size report and check size budgets.
+    """
+    from busta.size import bundles_sizes, format_size
+
+    parser = argparse.ArgumentParser(prog='busta size',
+                                     description='Bundles size report')
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    parser.add_argument('bundles', metavar='bundle', nargs='*',
+                        help='bundles to report (default: all bundles)')
+    parser.add_argument('-t', '--top', type=int, default=5,
+                        help='number of biggest files and modules to show')
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+
+    for name in options.bundles:
+        if name not in config.bundles:
+            print("Error: Bundle '{0}' is not defined".format(name))
+            sys.exit(1)
+
+    try:
+        reports = bundles_sizes(config, options.bundles or None)
+        config.save_caches()
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+    root_len = len(config.root_dir)
+    exceeded = []
+    for report in reports:
+        print_bundle_size(report, root_len, options.top)
+        for kind, size, budget in report.exceeded():
+            exceeded.append('Bundle "{0}" {1} size {2} exceeds budget {3}'
+                            .format(report.bundle.name, kind,
+                                    format_size(size), format_size(budget)))
+
+    if exceeded:
+        print()
+        for line in exceeded:
+            print("Error: {0}".format(line))
+        sys.exit(1)
+
+
+def affected_command(args):
+    """
+    Print bundles affected by changed files list from stdin.
+    """
+    from busta.affected import AffectedIndex
+
+    parser = argparse.ArgumentParser(
+        prog='busta affected',
+        description='Print bundles affected by changed files (from stdin)'
+    )
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+
+    try:
+        filenames = [line.strip() for line in sys.stdin if line.strip()]
+        affected = AffectedIndex(config).affected(filenames)
+        config.save_caches()
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+    if affected:
+        sys.stdout.write('\n'.join(affected) + '\n')
+
+
+def hot_command(args):
+    """
+    Watch modules files, rebuild affected bundles and push changed modules
+    to browsers.
+    """
+    import threading
+    import time
+
+    from busta.affected import AffectedIndex
+    from busta.build import Builder
+    from busta.hot import CLIENT_PATH, HotServer, Watcher, file_message
+
+    parser = argparse.ArgumentParser(
+        prog='busta hot',
+        description='Rebuild bundles on change and push changed modules'
+    )
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='events server host (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8035,
+                        help='events server port (default: 8035)')
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help='files polling interval in seconds')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of parallel jobs')
+    options = parser.parse_args(args)
+
+    try:
+        watcher = Watcher(options.config)
+        server = HotServer((options.host, options.port), watcher.config)
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    print("Client runtime: http://{0}:{1}{2}".format(
+        options.host, options.port, CLIENT_PATH
+    ))
+
+    try:
+        while True:
+            time.sleep(options.interval)
+            try:
+                changes = watcher.changes()
+                if changes is None:
+                    continue
+                old_config, filenames = changes
+                config = server.config = watcher.config
+
+                builder = Builder(config, jobs=options.jobs)
+                try:
+                    affected = AffectedIndex(config).affected(filenames)
+                    builder.build(affected)
+                    messages = [
+                        file_message(config, old_config, builder, filename)
+                        for filename in filenames
+                    ]
+                finally:
+                    builder.close()
+                config.save_caches()
+            except Exception as exc:
+                print("Error: {0}".format(exc))
+                continue
+
+            for filename in filenames:
+                print("Changed: {0}".format(
+                    os.path.relpath(filename, config.root_dir)
+                ))
+            if any(message['type'] == 'reload'
+                   for message in messages if message):
+                server.push({'type': 'reload'})
+            else:
+                for message in messages:
+                    if message:
+                        server.push(message)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def duplicates_command(args):
+    """
+    Print files with same content and bytes they waste in bundles.
+    """
+    from busta.duplicates import find_duplicates
+    from busta.size import format_size
+
+    parser = argparse.ArgumentParser(
+        prog='busta duplicates',
+        description='Print files with same content in bundles'
+    )
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+
+    try:
+        duplicates = find_duplicates(config)
+        config.save_caches()
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+    if not duplicates:
+        print("No duplicates found")
+        return
+
+    root_len = len(config.root_dir)
+    for duplicate in duplicates:
+        print('\nDuplicate {0}, {1} files, wastes {2}'.format(
+            format_size(duplicate.size), len(duplicate.files),
+            format_size(duplicate.wasted_size)
+        ))
+
+        count_i = len(duplicate.files)
+        for i, filename in enumerate(duplicate.files):
+            if i == 0:
+                prefix = '    Files '
+                if count_i == 1:
+                    prefix += DRAW_ONLY
+                else:
+                    prefix += DRAW_FROM
+            else:
+                prefix = ' ' * 10
+                if i == count_i - 1:
+                    prefix += DRAW_LAST
+                else:
+                    prefix += DRAW_NEXT
+            print(prefix + filename[root_len:])
+
+        count_i = len(duplicate.wasted)
+        for i, bundle_name in enumerate(sorted(duplicate.wasted.keys())):
+            if i == 0:
+                prefix = '  Bundles '
+                if count_i == 1:
+                    prefix += DRAW_ONLY
+                else:
+                    prefix += DRAW_FROM
+            else:
+                prefix = ' ' * 10
+                if i == count_i - 1:
+                    prefix += DRAW_LAST
+                else:
+                    prefix += DRAW_NEXT
+            print(u'{0}"{1}" {2}'.format(
+                prefix, FONT_UNDERLINE + bundle_name + FONT_OFF,
+                format_size(duplicate.wasted[bundle_name])
+            ))
+
+    print('\nTotal wasted: {0}'.format(format_size(
+        sum(duplicate.wasted_size for duplicate in duplicates)
+    )))
+
+
+def merge_manifests_command(args):
+    """
+    Merge per-shard build manifests.
+    """
+    from busta.manifest import (manifest_durations, merge_manifests,
+                                read_manifest, write_manifest)
+    from busta.shard import save_durations
+
+    parser = argparse.ArgumentParser(prog='busta merge-manifests',
+                                     description='Merge build manifests')
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    parser.add_argument('output', metavar='[output_file]',
+                        help='merged manifest filename')
+    parser.add_argument('manifests', metavar='[manifest_file]', nargs='+',
+                        help='per-shard manifest filenames')
+    parser.add_argument('--durations', metavar='[durations_file]',
+                        default=None,
+                        help='write bundles durations file for next sharded '
+                             'build (see build --shard-durations)')
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+
+    try:
+        manifest = merge_manifests([
+            read_manifest(filename) for filename in options.manifests
+        ], config.bundles.keys())
+        write_manifest(options.output, manifest)
+        if options.durations:
+            save_durations(options.durations, manifest_durations(manifest))
+    except Exception as exc:
+        print("Error: {0}".format(exc))
+        sys.exit(1)
+
+
+def print_config_info(config, verbosity, out):
+    """
+    Print config, modules and bundles info.
+    """
+    if verbosity >= 1:
+        out.line("Config file:      {0}".format(config.config_file))
+        if verbosity >= 3:
+            out.line()
+
+    if verbosity >= 1:
+        out.line("Root directory:   {0}".format(config.root_dir))
+        if verbosity >= 3:
+            out.line()
+
+    if verbosity >= 1 and config.output_dir:
+        out.line("Output directory: {0}".format(config.output_dir))
+        if verbosity >= 2:
+            out.line()
+
+    if verbosity >= 2:
+        print_modules_list(config, verbosity, out)
+        if verbosity >= 3:
+            out.line()
+
+    if verbosity >= 1:
+        print_bundles_list(config, verbosity, out)
+
+
+def list_command(args):
+    """
+    Print config, modules and bundles info.
+    """
+    parser = argparse.ArgumentParser(
+        description='Build static bundles',
+        epilog='commands: {0}'.format(', '.join(sorted(COMMANDS.keys())))
+    )
+    parser.add_argument('config', metavar='[config_file]',
+                        help='bundles config filename')
+    parser.add_argument('-v', action='count', default=0, dest='verbosity',
+                        help='verbosity level')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                        help='output format (default: text)')
+    options = parser.parse_args(args)
+
+    config = load_config(options.config)
+    out = TextOutput()
+
+    try:
+        if options.format == 'json':
+            write_json_list(config, out)
+        else:
+            print_config_info(config, options.verbosity, out)
+    finally:
+        out.flush()
+
+    config.save_caches()
+
+
+COMMANDS = {
+    'affected': affected_command,
+    'build': build_command,
+    'duplicates': duplicates_command,
+    'hot': hot_command,
+    'merge-manifests': merge_manifests_command,
+    'size': size_command,
+}
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] in COMMANDS:
+        COMMANDS[args[0]](args[1:])
+    else:
+        list_command(args)
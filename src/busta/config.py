@@ -3,8 +3,10 @@ Read and parse config files.
 """
 import json
 import os
+import threading
 
-from busta.bundle import Bundle
+from busta.bundle import BUDGET_KINDS, OUTPUT_MODES, Bundle
+from busta.cache import FileCache
 from busta.module import Module
 
 
@@ -15,6 +17,19 @@ class ConfigException(Exception):
     pass
 
 
+def default_cache_dir(config_file):
+    """
+    Returns default cache directory for config file: directory in user cache
+    directory (`$XDG_CACHE_HOME` or `~/.cache`), named after config file
+    path, so caches are kept outside of sources tree.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    name = os.path.splitdrive(config_file)[1].strip(os.path.sep)
+    return os.path.join(cache_home, 'busta', name.replace(os.path.sep, '%'))
+
+
 class Config(object):
     """
     Config parser and validator.
@@ -26,6 +41,14 @@ class Config(object):
     bundles = None  # bundles dictionary
     pre_processors = None  # pre-processors dictionary
     post_processors = None  # post-processors dictionary
+    cache_dir = None  # directory for build caches (see `default_cache_dir`)
+    template_pattern = '*.xml'  # template files pattern
+    template_compiler = None  # template compiler command
+    deduplicate_content = False  # `True` to skip files with same content
+    hard_links = False  # `True` to hard-link unbundled outputs to sources
+
+    _file_hashes = None
+    _file_hashes_lock = None
 
     def __init__(self, config_file):
         """
@@ -38,6 +61,13 @@ class Config(object):
         self.bundles = {}
         self.pre_processors = {}
         self.post_processors = {}
+        self.cache_dir = None
+        self.template_pattern = '*.xml'
+        self.template_compiler = None
+        self.deduplicate_content = False
+        self.hard_links = False
+        self._file_hashes = None
+        self._file_hashes_lock = threading.Lock()
         self.parse_config()
 
     @staticmethod
@@ -84,6 +114,20 @@ class Config(object):
             if not isinstance(config['output_dir'], basestring):
                 raise ConfigException("Param 'output_dir' must be 'string'")
 
+        if 'cache_dir' in config:
+            if not isinstance(config['cache_dir'], basestring):
+                raise ConfigException("Param 'cache_dir' must be 'string'")
+
+        if 'deduplicate_content' in config:
+            if not isinstance(config['deduplicate_content'], bool):
+                raise ConfigException(
+                    "Param 'deduplicate_content' must be 'bool'"
+                )
+
+        if 'hard_links' in config:
+            if not isinstance(config['hard_links'], bool):
+                raise ConfigException("Param 'hard_links' must be 'bool'")
+
         if 'modules' not in config:
             raise ConfigException("Param 'modules' is not found")
         if not isinstance(config['modules'], dict):
@@ -101,14 +145,57 @@ class Config(object):
             if not isinstance(config['post_processors'], dict):
                 raise ConfigException("Param 'post_processors' must be 'dict'")
 
+        if 'templates' in config:
+            if not isinstance(config['templates'], dict):
+                raise ConfigException("Param 'templates' must be 'dict'")
+
         config_params = (
-            'root_dir', 'output_dir', 'modules', 'bundles',
-            'pre_processors', 'post_processors'
+            'root_dir', 'output_dir', 'cache_dir', 'modules', 'bundles',
+            'pre_processors', 'post_processors', 'templates',
+            'deduplicate_content', 'hard_links'
         )
         for param in config.keys():
             if param not in config_params:
                 raise ConfigException("Unknown param '{0}'".format(param))
 
+    @staticmethod
+    def validate_worker(kind, name, params):
+        """
+        Validate persistent worker processor params.
+        """
+        if 'worker' not in params:
+            raise ConfigException(
+                "{0} '{1}' have no 'worker' param".format(kind, name)
+            )
+        if not isinstance(params['worker'], basestring):
+            raise ConfigException(
+                "{0} '{1}' 'worker' param must be 'string'".format(kind, name)
+            )
+
+        if 'workers' in params:
+            if not isinstance(params['workers'], int) or \
+                    params['workers'] < 1:
+                raise ConfigException((
+                    "{0} '{1}' 'workers' param"
+                    " must be positive 'int'").format(kind, name)
+                )
+
+        if 'timeout' in params:
+            if not isinstance(params['timeout'], (int, long, float)) or \
+                    params['timeout'] <= 0:
+                raise ConfigException((
+                    "{0} '{1}' 'timeout' param"
+                    " must be positive number").format(kind, name)
+                )
+
+        for param in params.keys():
+            if param not in ('worker', 'workers', 'timeout'):
+                raise ConfigException(
+                    "Unknown param '{0}' in {1} '{2}'".format(
+                        param, kind.lower(), name
+                    )
+                )
+
     @staticmethod
     def validate_pre_processors(pre_processors):
         """
@@ -122,7 +209,9 @@ class Config(object):
                 raise ConfigException(
                     "Pre_processor name '{0}' must be 'string'".format(name)
                 )
-            if not isinstance(command, basestring):
+            if isinstance(command, dict):
+                Config.validate_worker('Pre_processor', name, command)
+            elif not isinstance(command, basestring):
                 raise ConfigException(
                     "Pre_processor command '{0}' must be 'string'".format(name)
                 )
@@ -140,12 +229,39 @@ class Config(object):
                 raise ConfigException(
                     "Post_processor name '{0}' must be 'string'".format(name)
                 )
-            if not isinstance(command, basestring):
+            if isinstance(command, dict):
+                Config.validate_worker('Post_processor', name, command)
+            elif not isinstance(command, basestring):
                 raise ConfigException((
                     "Post_processor command '{0}'"
                     " must be 'string'").format(name)
                 )
 
+    @staticmethod
+    def validate_templates(templates):
+        """
+        Validate templates params from config.
+        """
+        if 'compiler' not in templates:
+            raise ConfigException("Templates have no 'compiler' param")
+        if not isinstance(templates['compiler'], basestring):
+            raise ConfigException(
+                "Templates 'compiler' param must be 'string'"
+            )
+
+        if 'pattern' in templates:
+            if not isinstance(templates['pattern'], basestring):
+                raise ConfigException(
+                    "Templates 'pattern' param must be 'string'"
+                )
+
+        templates_params = ('compiler', 'pattern')
+        for param in templates.keys():
+            if param not in templates_params:
+                raise ConfigException(
+                    "Unknown param '{0}' in templates".format(param)
+                )
+
     @staticmethod
     def validate_module(name, path):
         """
@@ -237,9 +353,56 @@ class Config(object):
                         " must be 'string'").format(name, processor)
                     )
 
+        if 'budget' in params:
+            if not isinstance(params['budget'], dict):
+                raise ConfigException(
+                    "Bundle '{0}' 'budget' param must be 'dict'".format(name)
+                )
+            for kind, size in params['budget'].items():
+                if kind not in BUDGET_KINDS:
+                    raise ConfigException((
+                        "Unknown budget '{0}' in bundle '{1}'"
+                    ).format(kind, name))
+                if not isinstance(size, (int, long)) or size < 0:
+                    raise ConfigException((
+                        "Bundle '{0}' budget '{1}'"
+                        " must be positive 'int'").format(name, kind)
+                    )
+
+        if 'async' in params:
+            if not isinstance(params['async'], list):
+                raise ConfigException(
+                    "Bundle '{0}' 'async' param must be 'list'".format(name)
+                )
+            for module in params['async']:
+                if not isinstance(module, basestring):
+                    raise ConfigException((
+                        "Bundle '{0}' async module name '{1}'"
+                        " must be 'string'").format(name, module)
+                    )
+
+        if 'output' in params:
+            if params['output'] not in OUTPUT_MODES:
+                raise ConfigException((
+                    "Bundle '{0}' 'output' param must be one of: {1}"
+                ).format(name, ', '.join(OUTPUT_MODES)))
+
+        if 'max_size' in params:
+            if not isinstance(params['max_size'], (int, long)) or \
+                    params['max_size'] <= 0:
+                raise ConfigException(
+                    "Bundle '{0}' 'max_size' param must be positive 'int'"
+                    .format(name)
+                )
+            if params.get('output') == 'unbundled':
+                raise ConfigException((
+                    "Bundle '{0}' 'max_size' param can't be used"
+                    " with 'unbundled' output").format(name)
+                )
+
         bundle_params = (
             'modules', 'output_dir', 'exclude', 'pre_processors',
-            'post_processors'
+            'post_processors', 'budget', 'async', 'output', 'max_size'
         )
         for param in params.keys():
             if param not in bundle_params:
@@ -247,6 +410,26 @@ class Config(object):
                     "Unknown param '{0}' in bundle '{1}'".format(param, name)
                 )
 
+    def file_hash(self, filename):
+        """
+        Returns (file size, SHA1 hex digest of file content) tuple.
+        """
+        from busta.writer import file_digest
+
+        with self._file_hashes_lock:
+            if self._file_hashes is None:
+                self._file_hashes = FileCache(
+                    'hashes', file_digest, self.cache_dir
+                )
+        return self._file_hashes.get(filename)
+
+    def save_caches(self):
+        """
+        Save config caches.
+        """
+        if self._file_hashes is not None:
+            self._file_hashes.save()
+
     def parse_config(self):
         """
         Parse config file and validate it.
@@ -275,6 +458,13 @@ class Config(object):
                 "Root directory '{0}' is not exist".format(self.root_dir)
             )
 
+        if 'cache_dir' in config:
+            self.cache_dir = os.path.abspath(
+                os.path.join(self.root_dir, config['cache_dir'])
+            )
+        else:
+            self.cache_dir = default_cache_dir(self.config_file)
+
         # get and validate pre_processors
         if 'pre_processors' in config:
             self.pre_processors = config['pre_processors']
@@ -285,6 +475,17 @@ class Config(object):
             self.post_processors = config['post_processors']
             Config.validate_post_processors(self.post_processors)
 
+        self.deduplicate_content = config.get('deduplicate_content', False)
+        self.hard_links = config.get('hard_links', False)
+
+        # get and validate templates params
+        if 'templates' in config:
+            Config.validate_templates(config['templates'])
+            self.template_compiler = config['templates']['compiler']
+            self.template_pattern = config['templates'].get(
+                'pattern', self.template_pattern
+            )
+
         # get and validate modules, create Module objects
         for name, path in config['modules'].iteritems():
             Config.validate_module(name, path)
@@ -317,5 +518,9 @@ class Config(object):
                 exclude=params.get('exclude'),
                 pre_processors=params.get('pre_processors'),
                 post_processors=params.get('post_processors'),
+                budget=params.get('budget'),
+                async_modules=params.get('async'),
+                output_mode=params.get('output'),
+                max_size=params.get('max_size'),
                 config=self
             )
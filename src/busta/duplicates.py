@@ -0,0 +1,81 @@
+"""
+Find files with same content across bundles.
+"""
+from busta.bundle import deduplicate
+
+
+class Duplicate(object):
+    """
+    Group of files with same content.
+    """
+    digest = None  # SHA1 hex digest of files content
+    size = None  # size of one file
+    files = None  # sorted list of files with this content
+    wasted = None  # dictionary of bundle name => wasted bytes
+
+    def __init__(self, digest, size):
+        self.digest = digest
+        self.size = size
+        self.files = []
+        self.wasted = {}
+
+    @property
+    def wasted_size(self):
+        """
+        Returns bytes wasted by this duplicate in all bundles.
+        """
+        return sum(self.wasted.values())
+
+
+def bundle_duplicates(bundle, all_files, excludes, groups):
+    """
+    Collect files with same content into groups and count bytes they waste
+    in bundle (file is wasted if it's content is already in bundle or in
+    bundle excluded files).
+    """
+    config = bundle.config
+
+    excluded_files = set()
+    for exclude_name in bundle.exclude:
+        excluded_files.update(excludes(config.bundles[exclude_name]))
+
+    seen = set()
+    for filename in excluded_files:
+        seen.add(config.file_hash(filename))
+
+    for filename in deduplicate(all_files):
+        if filename in excluded_files:
+            continue
+
+        key = config.file_hash(filename)
+        if key not in groups:
+            groups[key] = Duplicate(digest=key[1], size=key[0])
+        group = groups[key]
+        if filename not in group.files:
+            group.files.append(filename)
+
+        if key in seen:
+            group.wasted[bundle.name] = \
+                group.wasted.get(bundle.name, 0) + group.size
+        else:
+            seen.add(key)
+
+
+def find_duplicates(config):
+    """
+    Returns list of content duplicates in bundles JS and CSS files, biggest
+    waste first.
+    """
+    groups = {}
+    for name in sorted(config.bundles.keys()):
+        bundle = config.bundles[name]
+        bundle_duplicates(bundle, bundle.all_js_files,
+                          lambda exclude: exclude.all_js_files, groups)
+        bundle_duplicates(bundle, bundle.all_css_files,
+                          lambda exclude: exclude.all_css_files, groups)
+
+    duplicates = [group for group in groups.values() if len(group.files) > 1]
+    for group in duplicates:
+        group.files.sort()
+    duplicates.sort(key=lambda group: (-group.wasted_size, group.files[0]))
+    return duplicates
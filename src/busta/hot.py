@@ -0,0 +1,508 @@
+"""
+Hot module replacement for development.
+
+Watcher polls modules files, changed files are rebuilt into bundles and
+pushed to browsers through server-sent events endpoint, with changed file
+pre-processed code only.
+
+Client runtime replaces changed CSS file in place: on first change bundle
+stylesheet is split into one element per bundle CSS file (in bundle order,
+other files are loaded from events server once), then only element of
+changed file is replaced. Changed JS is re-evaluated, if one of modules with
+this file accepts it with `busta.hot.accept(name, callback)`, otherwise
+client reloads the page.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    import queue
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    import Queue as queue
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+from busta.build import Builder
+from busta.config import Config
+from busta.writer import StreamWriter
+
+
+CLIENT_PATH = '/busta/hmr.js'  # client runtime URL path
+EVENTS_PATH = '/busta/events'  # server-sent events URL path
+FILE_PATH = '/busta/file'  # pre-processed CSS file URL path
+KEEPALIVE_INTERVAL = 15.0  # seconds between keep-alive comments
+STOP_TIMEOUT = 1.0  # seconds to wait for clients handlers exit
+
+CLIENT_JS = """(function (window, document) {
+    var scripts = document.getElementsByTagName('script');
+    var current = document.currentScript || scripts[scripts.length - 1];
+    var base = current.src.replace(/[^\\/]*$/, '');
+    var busta = window.busta = window.busta || {};
+    var handlers = {};
+
+    busta.hot = {
+        accept: function (name, callback) {
+            handlers[name] = callback || function () {};
+        }
+    };
+
+    // content hash is dropped from unbundled output names
+    function outputName(href) {
+        return href.split('?')[0].replace(/\\.[0-9a-f]{12}(\\.css)$/, '$1');
+    }
+
+    function findOutput(href, outputs) {
+        var path = outputName(href);
+        for (var name in outputs) {
+            if (outputs.hasOwnProperty(name)) {
+                var suffix = '/' + outputName(name);
+                if (path.slice(-suffix.length) === suffix) {
+                    return name;
+                }
+            }
+        }
+        return null;
+    }
+
+    function fileElements(tag, file) {
+        var elements = document.getElementsByTagName(tag);
+        var result = [];
+        for (var i = 0; i < elements.length; i++) {
+            if (elements[i].getAttribute('data-busta-file') === file) {
+                result.push(elements[i]);
+            }
+        }
+        return result;
+    }
+
+    function fileStyle(file, code) {
+        var style = document.createElement('style');
+        style.setAttribute('data-busta-file', file);
+        style.appendChild(document.createTextNode(code));
+        return style;
+    }
+
+    function fileLink(link, file) {
+        var fresh = link.cloneNode(false);
+        fresh.setAttribute('data-busta-file', file);
+        fresh.href = base + 'file?name=' + encodeURIComponent(file);
+        return fresh;
+    }
+
+    // bundle stylesheet is split into elements of its files in bundle order:
+    // changed file is inlined, other files are loaded from events server
+    function splitLink(link, files, message) {
+        var pending = 0;
+        function loaded() {
+            if (--pending === 0 && link.parentNode) {
+                link.parentNode.removeChild(link);
+            }
+        }
+        for (var i = 0; i < files.length; i++) {
+            var element;
+            if (files[i] === message.file) {
+                element = fileStyle(files[i], message.code);
+            } else {
+                element = fileLink(link, files[i]);
+                element.onload = element.onerror = loaded;
+                pending++;
+            }
+            link.parentNode.insertBefore(element, link);
+        }
+        if (!pending) {
+            link.parentNode.removeChild(link);
+        }
+    }
+
+    function applyCss(message) {
+        var elements = fileElements('style', message.file).concat(
+            fileElements('link', message.file)
+        );
+        for (var i = 0; i < elements.length; i++) {
+            elements[i].parentNode.replaceChild(
+                fileStyle(message.file, message.code), elements[i]
+            );
+        }
+        if (elements.length) {
+            return;
+        }
+
+        var links = document.getElementsByTagName('link');
+        var split = [];
+        for (var j = 0; j < links.length; j++) {
+            var name = findOutput(links[j].href, message.outputs);
+            if (/\\bstylesheet\\b/i.test(links[j].rel) && name !== null &&
+                    !links[j].getAttribute('data-busta-file')) {
+                split.push([links[j], message.outputs[name]]);
+            }
+        }
+        for (var k = 0; k < split.length; k++) {
+            splitLink(split[k][0], split[k][1], message);
+        }
+        if (!split.length) {
+            window.location.reload();
+        }
+    }
+
+    function applyJs(message) {
+        var accepted = [];
+        for (var i = 0; i < message.modules.length; i++) {
+            if (handlers[message.modules[i]]) {
+                accepted.push(message.modules[i]);
+            }
+        }
+        if (!accepted.length) {
+            return window.location.reload();
+        }
+        (0, eval)(message.code + '\\n//# sourceURL=' + message.file);
+        for (var j = 0; j < accepted.length; j++) {
+            handlers[accepted[j]](message);
+        }
+    }
+
+    var source = new window.EventSource(base + 'events');
+    source.onmessage = function (event) {
+        var message = JSON.parse(event.data);
+        if (message.type === 'css') {
+            applyCss(message);
+        } else if (message.type === 'js') {
+            applyJs(message);
+        } else if (message.type === 'reload') {
+            window.location.reload();
+        }
+    };
+})(window, document);
+"""
+
+
+class BufferWriter(StreamWriter):
+    """
+    Stream writer into memory buffer.
+    """
+    def __init__(self):
+        StreamWriter.__init__(self, None)
+        self.chunks = []
+
+    def write(self, data):
+        """
+        Write data chunk.
+        """
+        if data:
+            self.chunks.append(data)
+            self.size += len(data)
+            self.last_byte = data[-1:]
+
+    @property
+    def data(self):
+        """
+        Returns written data.
+        """
+        return b''.join(self.chunks)
+
+
+class Watcher(object):
+    """
+    Poll config and modules files for changes.
+
+    Config is reloaded after every change, so new modules files and changed
+    JS dependencies are found on next change.
+    """
+    config_file = None  # config filename
+    config = None  # current config object
+    mtimes = None  # dictionary of filename => mtime
+
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self.config = Config(config_file)
+        self.mtimes = self.scan()
+
+    def files(self):
+        """
+        Returns set of watched files.
+        """
+        files = set([self.config.config_file])
+        for module in self.config.modules.values():
+            if module.js_file:
+                files.add(module.js_file)
+            files.update(module.css_files)
+            files.update(module.template_files)
+        return files
+
+    def scan(self):
+        """
+        Returns dictionary of watched filename => mtime.
+        """
+        mtimes = {}
+        for filename in self.files():
+            try:
+                mtimes[filename] = os.stat(filename).st_mtime
+            except OSError:
+                mtimes[filename] = None
+        return mtimes
+
+    def changes(self):
+        """
+        Returns (old config, list of changed files) after config reload, or
+        `None` if nothing is changed.
+        """
+        mtimes = self.scan()
+        changed = [
+            filename for filename, mtime in mtimes.items()
+            if self.mtimes.get(filename) != mtime
+        ]
+        if not changed:
+            return None
+
+        # broken config is reported once, it is reloaded on next change
+        self.mtimes = mtimes
+        old_config = self.config
+        self.config = Config(self.config_file)
+        self.mtimes = self.scan()
+        return old_config, sorted(changed)
+
+
+def file_bundles(config, filename):
+    """
+    Returns sorted list of bundles names, containing file.
+    """
+    return sorted(
+        name for name, bundle in config.bundles.items()
+        if filename in bundle.js_files or filename in bundle.css_files or
+        filename in bundle.template_files
+    )
+
+
+def file_message(config, old_config, builder, filename):
+    """
+    Returns message for changed file, to be pushed to browsers.
+    """
+    ext = os.path.splitext(filename)[1][1:]
+    if ext not in ('js', 'css') or filename == config.config_file or \
+            not os.path.isfile(filename):
+        return {'type': 'reload'}
+
+    modules = []
+    for name in sorted(config.modules.keys()):
+        module = config.modules[name]
+        if ext == 'js':
+            # changed dependencies can not be replaced in place
+            if module.js_file == filename:
+                old_module = old_config.modules.get(name)
+                if old_module is None or \
+                        old_module.js_dependencies != module.js_dependencies:
+                    return {'type': 'reload'}
+            if filename in module.js_files_list:
+                modules.append(name)
+        elif filename in module.css_files_list:
+            modules.append(name)
+
+    bundles = file_bundles(config, filename)
+    if not bundles:
+        return None
+
+    message = {
+        'type': ext,
+        'file': filename[len(config.root_dir):],
+        'modules': modules,
+        'bundles': bundles,
+    }
+
+    bundle = config.bundles[bundles[0]]
+    message['code'] = file_code(builder, bundle, filename, ext)
+
+    if ext == 'css':
+        message['outputs'] = css_outputs(config, builder, bundles)
+
+    return message
+
+
+def file_code(builder, bundle, filename, ext):
+    """
+    Returns file code, pre-processed with bundle pre-processors.
+    """
+    output = BufferWriter()
+    Builder.concat([filename], builder.processors(bundle)[0], output, ext)
+    return output.data.decode('utf-8', 'replace')
+
+
+def css_outputs(config, builder, bundles):
+    """
+    Returns dictionary of bundles CSS outputs (relative to bundle output
+    directory) => list of CSS files in output (relative to root directory).
+    """
+    outputs = {}
+    for name in bundles:
+        bundle = config.bundles[name]
+        files = [filename[len(config.root_dir):]
+                 for filename in bundle.css_files]
+        if bundle.output_mode == 'unbundled':
+            built = builder.unbundled.get(name, {}).get('css', [])
+            for output, filename in zip(built, files):
+                outputs[os.path.relpath(output, bundle.output_dir)] = \
+                    [filename]
+        elif files:
+            outputs[os.path.relpath(bundle.output_file('css'),
+                                    bundle.output_dir)] = files
+    return outputs
+
+
+def file_source(config, name):
+    """
+    Returns pre-processed code of bundles CSS file by its name (relative to
+    root directory), or `None` if there is no such file in bundles.
+    """
+    filename = os.path.normpath(os.path.join(config.root_dir, name))
+    if not filename.endswith('.css'):
+        return None
+
+    bundles = file_bundles(config, filename)
+    if not bundles:
+        return None
+
+    builder = Builder(config)
+    try:
+        return file_code(builder, config.bundles[bundles[0]], filename, 'css')
+    finally:
+        builder.close()
+
+
+class EventsHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler: client runtime and server-sent events.
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == CLIENT_PATH:
+            self.send_data(CLIENT_JS, 'application/javascript')
+        elif url.path == EVENTS_PATH:
+            self.send_events()
+        elif url.path == FILE_PATH:
+            self.send_file(parse_qs(url.query).get('name', [''])[0])
+        else:
+            self.send_error(404)
+
+    def send_data(self, data, content_type):
+        """
+        Send text response.
+        """
+        data = data.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_file(self, name):
+        """
+        Send pre-processed bundles CSS file.
+        """
+        config = self.server.config
+        try:
+            data = file_source(config, name) if config else None
+        except Exception as exc:
+            self.send_error(500, str(exc))
+            return
+
+        if data is None:
+            self.send_error(404)
+        else:
+            self.send_data(data, 'text/css')
+
+    def send_events(self):
+        """
+        Stream pushed messages to client until it disconnects.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        messages = self.server.subscribe()
+        try:
+            while True:
+                try:
+                    message = messages.get(timeout=KEEPALIVE_INTERVAL)
+                    if message is None:
+                        return
+                    data = 'data: {0}\n\n'.format(json.dumps(message))
+                except queue.Empty:
+                    data = ': keep-alive\n\n'
+                self.wfile.write(data.encode('utf-8'))
+                self.wfile.flush()
+        except (IOError, OSError):
+            pass
+        finally:
+            self.server.unsubscribe(messages)
+
+
+class HotServer(ThreadingMixIn, HTTPServer):
+    """
+    Hot module replacement events server.
+    """
+    daemon_threads = True
+    config = None  # current config object, CSS files are served from it
+    clients = None  # list of clients messages queues
+    stopped = None  # `True` if server is stopped
+    _lock = None
+
+    def __init__(self, address, config=None):
+        HTTPServer.__init__(self, address, EventsHandler)
+        self.config = config
+        self.clients = []
+        self.stopped = False
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """
+        Returns new client messages queue.
+        """
+        messages = queue.Queue()
+        with self._lock:
+            if self.stopped:
+                messages.put(None)
+            self.clients.append(messages)
+        return messages
+
+    def unsubscribe(self, messages):
+        """
+        Remove client messages queue.
+        """
+        with self._lock:
+            if messages in self.clients:
+                self.clients.remove(messages)
+
+    def push(self, message):
+        """
+        Push message to all clients.
+        """
+        with self._lock:
+            for messages in self.clients:
+                messages.put(message)
+
+    def stop(self):
+        """
+        Stop server: end clients streams and wait for their handlers exit.
+        """
+        with self._lock:
+            self.stopped = True
+            for messages in self.clients:
+                messages.put(None)
+
+        self.shutdown()
+
+        deadline = time.time() + STOP_TIMEOUT
+        while self.clients and time.time() < deadline:
+            time.sleep(0.01)
+        self.server_close()
@@ -0,0 +1,120 @@
+"""
+Build manifests.
+"""
+import json
+import os
+
+from busta.writer import file_digest
+
+
+class ManifestException(Exception):
+    """
+    Manifest exception.
+    """
+    pass
+
+
+def build_manifest(config, outputs, digests=None, durations=None):
+    """
+    Returns manifest for built bundles.
+
+    :param outputs: dictionary of bundle name => list of written files
+    :param digests: dictionary of written filename => SHA1 hex digest
+    :param durations: dictionary of bundle name => build duration
+    """
+    digests = digests or {}
+    durations = durations or {}
+
+    bundles = {}
+    for name, filenames in outputs.items():
+        files = {}
+        for filename in filenames:
+            files[os.path.relpath(filename, config.root_dir)] = {
+                'sha1': digests.get(filename) or file_digest(filename),
+                'size': os.path.getsize(filename),
+            }
+        bundles[name] = {'files': files}
+        if name in durations:
+            bundles[name]['duration'] = round(durations[name], 3)
+
+    return {'bundles': bundles}
+
+
+def read_manifest(filename):
+    """
+    Read manifest file.
+    """
+    try:
+        with open(filename) as file_data:
+            manifest = json.load(file_data)
+    except (IOError, OSError, ValueError) as exc:
+        raise ManifestException(
+            "Error while reading manifest {0}: {1}".format(filename, exc)
+        )
+
+    if not isinstance(manifest, dict) or \
+            not isinstance(manifest.get('bundles'), dict):
+        raise ManifestException(
+            "Manifest {0} have no 'bundles' dict".format(filename)
+        )
+
+    return manifest
+
+
+def write_manifest(filename, manifest):
+    """
+    Write manifest file.
+    """
+    try:
+        with open(filename, 'w') as file_data:
+            json.dump(manifest, file_data, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+            file_data.write('\n')
+    except (IOError, OSError) as exc:
+        raise ManifestException(
+            "Error while writing manifest {0}: {1}".format(filename, exc)
+        )
+
+
+def merge_manifests(manifests, bundles_names=None):
+    """
+    Merge per-shard manifests into one manifest.
+
+    Same bundle could be present in several manifests only with same files
+    (first build duration is kept). If `bundles_names` is defined, every
+    bundle must be present in merged manifest.
+    """
+    bundles = {}
+    for manifest in manifests:
+        for name, bundle in manifest['bundles'].items():
+            if name in bundles:
+                if bundles[name].get('files') != bundle.get('files'):
+                    raise ManifestException(
+                        "Bundle '{0}' differs in merged manifests".format(
+                            name
+                        )
+                    )
+                continue
+            bundles[name] = bundle
+
+    missing = sorted(set(bundles_names or ()) - set(bundles))
+    if missing:
+        raise ManifestException(
+            "Bundles are missing in merged manifests: {0}".format(
+                ', '.join(missing)
+            )
+        )
+
+    return {'bundles': bundles}
+
+
+def manifest_durations(manifest):
+    """
+    Returns dictionary of bundle name => build duration, recorded in
+    manifest.
+    """
+    return dict(
+        (name, bundle['duration'])
+        for name, bundle in manifest['bundles'].items()
+        if isinstance(bundle.get('duration'), (int, float))
+    )
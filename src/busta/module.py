@@ -27,13 +27,16 @@ class Module(object):
     js_file = None  # module Javascript file (always only one JS file)
     js_dependencies = None  # list of module JavaScript dependencies
     css_files = None  # list of module css files
+    template_files = None  # list of module template files
 
     _js_files_list = None
     _css_files_list = None
+    _template_files_list = None
 
     def __init__(self, name, path, config):
         self._js_files_list = None
         self._css_files_list = None
+        self._template_files_list = None
 
         self.name = name
         self.rel_path = path
@@ -131,6 +134,21 @@ class Module(object):
             css_file for css_file in Module.find_files(self.abs_path, '*.css')
         ])
 
+    def find_templates(self):
+        """
+        Find module template files.
+        """
+        self.template_files = []
+
+        if self.is_simple or not self.config.template_compiler:
+            return
+
+        self.template_files = sorted([
+            template_file for template_file in Module.find_files(
+                self.abs_path, self.config.template_pattern
+            )
+        ])
+
     def prepare_files(self):
         """
         Find all module files: js, css, fest templates, etc.
@@ -138,6 +156,7 @@ class Module(object):
         self.find_js()
         self.find_js_dependencies()
         self.find_css()
+        self.find_templates()
 
     @property
     def js_files_list(self):
@@ -145,15 +164,18 @@ class Module(object):
         Returns list of module JS files (including dependencies).
         """
         if self._js_files_list is None:
-            self._js_files_list = []
+            js_files_list = []
 
             if self.js_file and self.js_dependencies:
                 for module in self.js_dependencies:
                     for js_deps in self.config.modules[module].js_files_list:
-                        self._js_files_list.append(js_deps)
+                        js_files_list.append(js_deps)
 
             if self.js_file:
-                self._js_files_list.append(self.js_file)
+                js_files_list.append(self.js_file)
+
+            # list is cached only when complete: it is read from threads
+            self._js_files_list = js_files_list
 
         return self._js_files_list
 
@@ -163,14 +185,37 @@ class Module(object):
         Returns list of module CSS files (including dependencies).
         """
         if self._css_files_list is None:
-            self._css_files_list = []
+            css_files_list = []
 
             if self.js_file and self.js_dependencies:
                 for module in self.js_dependencies:
                     for css_deps in self.config.modules[module].css_files_list:
-                        self._css_files_list.append(css_deps)
+                        css_files_list.append(css_deps)
 
             if self.css_files:
-                self._css_files_list.extend(self.css_files)
+                css_files_list.extend(self.css_files)
+
+            self._css_files_list = css_files_list
 
         return self._css_files_list
+
+    @property
+    def template_files_list(self):
+        """
+        Returns list of module template files (including dependencies).
+        """
+        if self._template_files_list is None:
+            template_files_list = []
+
+            if self.js_file and self.js_dependencies:
+                for module in self.js_dependencies:
+                    module = self.config.modules[module]
+                    for template_deps in module.template_files_list:
+                        template_files_list.append(template_deps)
+
+            if self.template_files:
+                template_files_list.extend(self.template_files)
+
+            self._template_files_list = template_files_list
+
+        return self._template_files_list
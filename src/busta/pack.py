@@ -0,0 +1,342 @@
+"""
+Indexed asset pack: all bundles outputs in a single file.
+
+Pack file layout:
+
+    magic | entries data | index | trailer
+
+Index is a list of entries: name length (2 bytes), name (UTF-8), offset and
+length (8 bytes each), SHA1 digest (20 bytes), content type length (1 byte)
+and content type. Trailer is index offset and length (8 bytes each) followed
+by magic. All numbers are big-endian.
+
+Every output is stored under its path relative to pack file directory, with
+gzip-compressed variant stored under the same name with '.gz' suffix (only if
+it is smaller).
+"""
+import binascii
+import hashlib
+import mimetypes
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+
+from busta.size import COMPRESS_LEVEL
+from busta.writer import OutputWriter
+
+
+MAGIC = b'BPAK'  # pack file magic
+GZIP_SUFFIX = '.gz'  # name suffix of gzip-compressed variant
+ENTRY = struct.Struct('>QQ20s')  # entry offset, length and digest
+TRAILER = struct.Struct('>QQ4s')  # index offset, length and magic
+NAME_SIZE = struct.Struct('>H')  # entry name length
+TYPE_SIZE = struct.Struct('>B')  # entry content type length
+
+CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.html': 'text/html',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+}
+
+
+class PackException(Exception):
+    """
+    Pack exception.
+    """
+    pass
+
+
+def content_type(name):
+    """
+    Returns content type for entry name.
+    """
+    ext = os.path.splitext(name)[1]
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+class PackWriter(OutputWriter):
+    """
+    Atomic pack file writer, use it as context manager.
+
+    Outputs are added (from any thread) right after they are written: every
+    output is read once, counting its digest and compressing it into spool
+    file, without holding a lock. Entries are appended to pack on exit in
+    sorted names order, followed by index: pack is not streamed in build
+    threads completion order, so same outputs always give same pack file.
+    Outputs are read again on exit and checked against their digests.
+    """
+    base_dir = None  # entries names are relative to this directory
+    entries = None  # list of (name, offset, length, digest, content type)
+    pending = None  # dictionary of name => (filename, digest, spool file)
+    _spool_dir = None
+    _lock = None
+
+    def __init__(self, filename):
+        filename = os.path.abspath(filename)
+        OutputWriter.__init__(self, filename)
+        self.base_dir = os.path.dirname(filename)
+        self.entries = []
+        self.pending = {}
+        self._spool_dir = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        OutputWriter.__enter__(self)
+        self._spool_dir = tempfile.mkdtemp(
+            dir=os.path.dirname(self._temp_file),
+            prefix='.{0}.'.format(os.path.basename(self.filename)),
+            suffix='.spool'
+        )
+        self.write(MAGIC)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                try:
+                    self.write_entries()
+                    self.write_index()
+                except Exception:
+                    exc_type, exc_value, traceback = sys.exc_info()
+                    raise
+        finally:
+            try:
+                OutputWriter.__exit__(self, exc_type, exc_value, traceback)
+            finally:
+                shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+    def entry_name(self, filename):
+        """
+        Returns entry name for output filename.
+        """
+        return os.path.relpath(filename, self.base_dir).replace(
+            os.path.sep, '/'
+        )
+
+    def add(self, filename):
+        """
+        Add output file into pack: count its digest and compress it into
+        spool file (kept only if compressed data is smaller).
+        """
+        name = self.entry_name(filename)
+
+        with self._lock:
+            if name in self.pending:
+                return
+            self.pending[name] = None
+
+        try:
+            entry = self.spool_entry(filename)
+        except BaseException:
+            with self._lock:
+                del self.pending[name]
+            raise
+
+        with self._lock:
+            self.pending[name] = entry
+
+    def spool_entry(self, filename):
+        """
+        Returns pending entry for output file: (filename, digest, spool
+        filename or `None`).
+        """
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        digest = hashlib.sha1()
+        length = 0
+        handle, spool = tempfile.mkstemp(dir=self._spool_dir)
+        with os.fdopen(handle, 'wb') as spool_data:
+            with open(filename, 'rb') as file_data:
+                for chunk in iter(lambda: file_data.read(self.buffer_size),
+                                  b''):
+                    digest.update(chunk)
+                    length += len(chunk)
+                    spool_data.write(compressor.compress(chunk))
+            spool_data.write(compressor.flush())
+            compressed = spool_data.tell()
+
+        if compressed >= length:
+            os.unlink(spool)
+            spool = None
+
+        return filename, digest.digest(), spool
+
+    def add_entry(self, name, stream, ctype):
+        """
+        Copy stream into pack as new entry, returns entry digest.
+        """
+        offset = self.size
+        digest = hashlib.sha1()
+        for chunk in iter(lambda: stream.read(self.buffer_size), b''):
+            self.write(chunk)
+            digest.update(chunk)
+        self.entries.append((name, offset, self.size - offset,
+                             digest.digest(), ctype))
+        return digest.digest()
+
+    def write_entries(self):
+        """
+        Append pending entries (and their gzip-compressed variants) in sorted
+        names order.
+        """
+        for name in sorted(self.pending):
+            filename, digest, spool = self.pending[name]
+            ctype = content_type(name)
+
+            with open(filename, 'rb') as file_data:
+                if self.add_entry(name, file_data, ctype) != digest:
+                    raise PackException(
+                        "Output {0} is changed while packing".format(filename)
+                    )
+
+            if spool is not None:
+                with open(spool, 'rb') as spool_data:
+                    self.add_entry(name + GZIP_SUFFIX, spool_data, ctype)
+
+    def write_index(self):
+        """
+        Write entries index and trailer.
+        """
+        offset = self.size
+        for name, entry_offset, length, digest, ctype in sorted(self.entries):
+            name = name.encode('utf-8')
+            ctype = ctype.encode('ascii')
+            self.write(NAME_SIZE.pack(len(name)))
+            self.write(name)
+            self.write(ENTRY.pack(entry_offset, length, digest))
+            self.write(TYPE_SIZE.pack(len(ctype)))
+            self.write(ctype)
+        self.write(TRAILER.pack(offset, self.size - offset, MAGIC))
+
+
+class PackEntry(object):
+    """
+    Pack entry.
+    """
+    name = None  # entry name
+    offset = None  # entry data offset in pack file
+    length = None  # entry data length
+    digest = None  # SHA1 hex digest of entry data
+    content_type = None  # entry content type
+
+    def __init__(self, name, offset, length, digest, content_type):
+        self.name = name
+        self.offset = offset
+        self.length = length
+        self.digest = digest
+        self.content_type = content_type
+
+
+class PackReader(object):
+    """
+    Pack file reader: index is read from memory-mapped pack file, entries
+    data is sent to sockets or files with `os.sendfile` (if available).
+    """
+    filename = None  # pack filename
+    entries = None  # dictionary of name => pack entry
+    _file = None
+    _map = None
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self._file = open(filename, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self.read_index()
+        except (EnvironmentError, ValueError, struct.error) as exc:
+            self.close()
+            raise PackException(
+                "Error while reading pack {0}: {1}".format(filename, exc)
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close pack file.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def read_index(self):
+        """
+        Read entries index.
+        """
+        data = self._map
+        if data[:len(MAGIC)] != MAGIC or len(data) < TRAILER.size:
+            raise ValueError("not a pack file")
+        offset, length, magic = TRAILER.unpack_from(
+            data, len(data) - TRAILER.size
+        )
+        if magic != MAGIC:
+            raise ValueError("pack trailer is broken")
+
+        end = offset + length
+        while offset < end:
+            size = NAME_SIZE.unpack_from(data, offset)[0]
+            offset += NAME_SIZE.size
+            name = data[offset:offset + size].decode('utf-8')
+            offset += size
+            entry_offset, entry_length, digest = ENTRY.unpack_from(
+                data, offset
+            )
+            offset += ENTRY.size
+            size = TYPE_SIZE.unpack_from(data, offset)[0]
+            offset += TYPE_SIZE.size
+            ctype = data[offset:offset + size].decode('ascii')
+            offset += size
+            self.entries[name] = PackEntry(
+                name, entry_offset, entry_length,
+                binascii.hexlify(digest).decode('ascii'), ctype
+            )
+
+    def get(self, name, gzip=False):
+        """
+        Returns pack entry by name (gzip-compressed variant, if requested and
+        exists), or `None`.
+        """
+        if gzip and name + GZIP_SUFFIX in self.entries:
+            return self.entries[name + GZIP_SUFFIX]
+        return self.entries.get(name)
+
+    def read(self, entry, start=0, end=None):
+        """
+        Returns entry data range.
+        """
+        end = entry.length if end is None else min(end, entry.length)
+        return self._map[entry.offset + start:entry.offset + end]
+
+    def send(self, fd, entry, start=0, end=None):
+        """
+        Send entry data range to file descriptor, returns sent size.
+        """
+        end = entry.length if end is None else min(end, entry.length)
+        offset = entry.offset + start
+        count = end - start
+        sent = 0
+        while sent < count:
+            if hasattr(os, 'sendfile'):
+                size = os.sendfile(fd, self._file.fileno(), offset + sent,
+                                   count - sent)
+            else:
+                size = os.write(fd, self._map[offset + sent:offset + count])
+            if not size:
+                break
+            sent += size
+        return sent
@@ -0,0 +1,89 @@
+"""
+Size-capped parts of bundle JS file.
+"""
+import os
+import re
+
+
+class Part(object):
+    """
+    Part object: consecutive JS files of bundle.
+    """
+    bundle = None  # bundle object
+    index = None  # 1-based part index
+    js_files = None  # list of part JS files
+    size = None  # size of part JS files
+
+    def __init__(self, bundle, index):
+        self.bundle = bundle
+        self.index = index
+        self.js_files = []
+        self.size = 0
+
+    @property
+    def output_file(self):
+        """
+        Returns part output filename.
+        """
+        return self.bundle.output_file('{0}.js'.format(self.index))
+
+
+def bundle_parts(bundle):
+    """
+    Returns list of bundle JS parts in loading order.
+
+    Files are packed greedily in bundle order, new part is started when next
+    file does not fit into `max_size` (file bigger than `max_size` gets its
+    own part). Part boundary depends only on previous files sizes, so parts
+    before changed file keep their content. Sizes are module files sizes,
+    before pre-processing.
+    """
+    parts = []
+    part = None
+    for js_file in bundle.js_files:
+        size = os.path.getsize(js_file)
+        if part is None or (part.js_files and
+                            part.size + size > bundle.max_size):
+            part = Part(bundle, len(parts) + 1)
+            parts.append(part)
+        part.js_files.append(js_file)
+        part.size += size
+    return parts
+
+
+def parts_manifest(parts):
+    """
+    Returns parts manifest: list of parts files to load in order.
+    """
+    return {
+        'js': [os.path.basename(part.output_file) for part in parts],
+    }
+
+
+def stale_parts(bundle, parts=None):
+    """
+    Returns list of existing bundle JS outputs, not written with parts: parts
+    with index above parts count and whole bundle JS file, or (if bundle is
+    built without parts, `parts` is `None`) all parts and parts manifest.
+    """
+    output_dir = os.path.dirname(bundle.output_file('js'))
+    if not os.path.isdir(output_dir):
+        return []
+
+    part_re = re.compile(r'^{0}(?:\.(\d+))?\.js$'.format(
+        re.escape(bundle.name)
+    ))
+    manifest = os.path.basename(bundle.output_file('parts.json'))
+
+    stale = []
+    for basename in sorted(os.listdir(output_dir)):
+        match = part_re.match(basename)
+        if parts is None:
+            is_stale = basename == manifest or \
+                bool(match and match.group(1) is not None)
+        else:
+            is_stale = bool(match) and (match.group(1) is None or
+                                        int(match.group(1)) > len(parts))
+        if is_stale:
+            stale.append(os.path.join(output_dir, basename))
+    return stale
@@ -0,0 +1,233 @@
+"""
+Tasks DAG scheduler.
+"""
+import heapq
+import multiprocessing
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class SchedulerException(Exception):
+    """
+    Scheduler exception.
+    """
+    pass
+
+
+class Task(object):
+    """
+    Task object.
+    """
+    name = None  # unique task name
+    func = None  # callable to run
+    deps = None  # list of tasks names this task depends on
+    estimate = None  # estimated task duration in seconds
+    duration = None  # real task duration in seconds
+    result = None  # task callable result
+
+    def __init__(self, name, func, deps=None, estimate=0.0):
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+        self.estimate = estimate
+        self.duration = None
+        self.result = None
+
+
+class Scheduler(object):
+    """
+    Run tasks DAG on worker threads pool.
+
+    Ready tasks are started in order of their critical path length (task
+    duration plus the longest path through its dependents), so long chains
+    are started first and workers stay busy until the end of the build.
+    """
+    tasks = None  # tasks dictionary
+    jobs = None  # number of worker threads
+    priorities = None  # critical path length for every task
+    wall_time = None  # total run time in seconds
+
+    def __init__(self, tasks, jobs=None):
+        self.tasks = {}
+        for task in tasks:
+            if task.name in self.tasks:
+                raise SchedulerException(
+                    "Task '{0}' is defined twice".format(task.name)
+                )
+            self.tasks[task.name] = task
+
+        for task in self.tasks.values():
+            for dep in task.deps:
+                if dep not in self.tasks:
+                    raise SchedulerException(
+                        "Task '{0}' depends on unknown task '{1}'".format(
+                            task.name, dep
+                        )
+                    )
+
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.priorities = self.critical_paths()
+        self.wall_time = None
+
+    def dependents(self):
+        """
+        Returns dictionary of task name => list of dependent tasks names.
+        """
+        dependents = dict((name, []) for name in self.tasks)
+        for task in self.tasks.values():
+            for dep in task.deps:
+                dependents[dep].append(task.name)
+        return dependents
+
+    def critical_paths(self):
+        """
+        Returns dictionary of task name => critical path length.
+        """
+        dependents = self.dependents()
+        priorities = {}
+
+        # iterative depth-first post-order walk, with cycles detection
+        for root in sorted(self.tasks):
+            stack = [(root, False)]
+            visiting = set()
+            while stack:
+                name, done = stack.pop()
+                if name in priorities:
+                    continue
+                if done:
+                    visiting.discard(name)
+                    priorities[name] = self.tasks[name].estimate + max(
+                        [priorities[dep] for dep in dependents[name]] or [0.0]
+                    )
+                    continue
+                if name in visiting:
+                    raise SchedulerException(
+                        "Tasks cycle found at task '{0}'".format(name)
+                    )
+                visiting.add(name)
+                stack.append((name, True))
+                for dep in dependents[name]:
+                    if dep not in priorities:
+                        stack.append((dep, False))
+
+        return priorities
+
+    def worker(self, tasks_queue, done_queue):
+        """
+        Worker thread: run tasks until `None` is received.
+        """
+        while True:
+            task = tasks_queue.get()
+            if task is None:
+                return
+
+            started = time.time()
+            try:
+                task.result = task.func()
+                error = None
+            except Exception as exc:
+                error = exc
+            task.duration = time.time() - started
+            done_queue.put((task, error))
+
+    def run(self):
+        """
+        Run all tasks, returns dictionary of task name => task result.
+        """
+        dependents = self.dependents()
+        waiting = dict(
+            (name, len(task.deps)) for name, task in self.tasks.items()
+        )
+        ready = [
+            (-self.priorities[name], name)
+            for name, count in waiting.items() if not count
+        ]
+        heapq.heapify(ready)
+
+        tasks_queue = queue.Queue()
+        done_queue = queue.Queue()
+        workers = [
+            threading.Thread(target=self.worker,
+                             args=(tasks_queue, done_queue))
+            for _ in range(min(self.jobs, len(self.tasks)) or 1)
+        ]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        started = time.time()
+        running = 0
+        finished = 0
+        errors = []
+        try:
+            while finished < len(self.tasks):
+                while ready and running < len(workers) and not errors:
+                    tasks_queue.put(self.tasks[heapq.heappop(ready)[1]])
+                    running += 1
+
+                if not running:
+                    break
+
+                task, error = done_queue.get()
+                running -= 1
+                finished += 1
+
+                if error is not None:
+                    errors.append((task.name, error))
+                    continue
+
+                for name in dependents[task.name]:
+                    waiting[name] -= 1
+                    if not waiting[name]:
+                        heapq.heappush(ready, (-self.priorities[name], name))
+        finally:
+            for _ in workers:
+                tasks_queue.put(None)
+            for worker in workers:
+                worker.join()
+            self.wall_time = time.time() - started
+
+        if errors:
+            name, error = errors[0]
+            raise SchedulerException(
+                "Task '{0}' failed: {1}".format(name, error)
+            )
+
+        return dict((name, task.result) for name, task in self.tasks.items())
+
+    @property
+    def efficiency(self):
+        """
+        Returns parallel efficiency: busy workers time / available time.
+        """
+        busy = sum(task.duration or 0.0 for task in self.tasks.values())
+        workers = min(self.jobs, len(self.tasks)) or 1
+        if not self.wall_time:
+            return 1.0
+        return busy / (self.wall_time * workers)
+
+    def summary(self):
+        """
+        Returns list of summary lines: tasks wall time and efficiency.
+        """
+        tasks = sorted(
+            self.tasks.values(),
+            key=lambda task: (-(task.duration or 0.0), task.name)
+        )
+
+        max_length = max([len(task.name) for task in tasks] or [0])
+        str_format = u"{{0: <{0}}} {{1: >8.3f}}s".format(max_length)
+
+        lines = [str_format.format(task.name, task.duration or 0.0)
+                 for task in tasks]
+        lines.append(u"Total: {0:.3f}s wall, {1} workers, {2:.0%} "
+                     u"parallel efficiency".format(
+                         self.wall_time or 0.0,
+                         min(self.jobs, len(self.tasks)) or 1,
+                         self.efficiency))
+        return lines
@@ -0,0 +1,178 @@
+"""
+Split bundles between build shards.
+
+By default bundles are split by input files sizes. To split by recorded
+build durations, every shard must use the same durations file, e.g. in CI:
+
+    busta build config.json --shard i/n --shard-durations durations.json \
+        --manifest shard-i.json
+    busta merge-manifests config.json manifest.json shard-*.json \
+        --durations durations.json
+
+Per-shard manifests record build duration of every built bundle, merged
+durations file is kept (as CI cache or artifact) for the next build.
+"""
+import json
+import os
+import re
+
+
+class ShardException(Exception):
+    """
+    Shard exception.
+    """
+    pass
+
+
+def parse_shard(value):
+    """
+    Parse shard string 'i/n' into (index, count) tuple, index starts from 1.
+    """
+    match = re.match(r'^\s*(\d+)\s*/\s*(\d+)\s*$', value or '')
+    if not match:
+        raise ShardException(
+            "Shard '{0}' must be in 'i/n' format".format(value)
+        )
+
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise ShardException(
+            "Shard '{0}' index must be between 1 and {1}".format(value, count)
+        )
+
+    return index, count
+
+
+def durations_file(config, kind='bundles'):
+    """
+    Returns filename with recorded build durations ('bundles' or 'tasks').
+    """
+    return os.path.join(config.cache_dir, '{0}_durations.json'.format(kind))
+
+
+def load_durations(filename):
+    """
+    Load build durations from file, returns empty dictionary if file does
+    not exist or is broken.
+    """
+    try:
+        with open(filename) as file_data:
+            durations = json.load(file_data)
+    except (IOError, OSError, ValueError):
+        return {}
+
+    if not isinstance(durations, dict):
+        return {}
+    return durations
+
+
+def read_durations(config, kind='bundles'):
+    """
+    Read recorded build durations.
+    """
+    return load_durations(durations_file(config, kind))
+
+
+def save_durations(filename, durations):
+    """
+    Save build durations to file atomically.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temp_file = '{0}.{1}.tmp'.format(filename, os.getpid())
+    with open(temp_file, 'w') as file_data:
+        json.dump(durations, file_data, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+    os.rename(temp_file, filename)
+
+
+def write_durations(config, durations, kind='bundles'):
+    """
+    Update recorded build durations.
+    """
+    all_durations = read_durations(config, kind)
+    all_durations.update(durations)
+    save_durations(durations_file(config, kind), all_durations)
+
+
+def bundle_size(bundle):
+    """
+    Returns total size of bundle input files.
+    """
+    size = 0
+    for filename in bundle.js_files + bundle.css_files + bundle.template_files:
+        try:
+            size += os.path.getsize(filename)
+        except OSError:
+            pass
+    return size
+
+
+def bundles_costs(config, durations=None):
+    """
+    Returns bundles build cost estimates.
+
+    Costs are total input files sizes, so they are same on every machine
+    with same sources. Build durations (loaded from file shared between all
+    shards, see `merge-manifests --durations`) are used only if they are
+    known for all bundles: mixing both is meaningless. Locally recorded
+    durations are never used, they differ between machines and shards would
+    get different splits.
+    """
+    if durations and all(
+        isinstance(durations.get(name), (int, float))
+        for name in config.bundles
+    ):
+        return dict(
+            (name, float(durations[name])) for name in config.bundles
+        )
+
+    return dict(
+        (name, bundle_size(bundle))
+        for name, bundle in config.bundles.items()
+    )
+
+
+def split_bundles(config, count, durations=None):
+    """
+    Split bundles into `count` shards with balanced costs.
+
+    Bundles are assigned with longest-processing-time-first greedy
+    bin-packing, ties are broken by bundle name and shard number, so every
+    CI machine gets the same split for the same config and costs.
+
+    Bundle build needs only file lists of its excluded bundles, and they are
+    resolved from config on every shard, so excluded bundles are not forced
+    into the same shard.
+    """
+    costs = bundles_costs(config, durations)
+
+    shards = [[] for _ in range(count)]
+    loads = [0] * count
+    for name in sorted(costs, key=lambda name: (-costs[name], name)):
+        index = min(range(count), key=lambda i: (loads[i], i))
+        shards[index].append(name)
+        loads[index] += costs[name]
+
+    return [sorted(shard) for shard in shards]
+
+
+def shard_bundles(config, shard, durations_filename=None):
+    """
+    Returns sorted list of bundles names for shard string 'i/n'.
+
+    :param durations_filename: shared bundles durations file (optional)
+    """
+    index, count = parse_shard(shard)
+
+    durations = None
+    if durations_filename:
+        if not os.path.isfile(durations_filename):
+            raise ShardException(
+                "Durations file {0} does not exist".format(durations_filename)
+            )
+        durations = load_durations(durations_filename)
+
+    return split_bundles(config, count, durations)[index - 1]
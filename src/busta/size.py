@@ -0,0 +1,143 @@
+"""
+Bundles size report and budgets.
+"""
+import zlib
+
+from busta.cache import FileCache
+from busta.writer import BUFFER_SIZE
+
+
+COMPRESS_LEVEL = 6  # gzip compression level for size estimates
+
+
+def deflate_size(filename, level=COMPRESS_LEVEL):
+    """
+    Returns size of raw deflate-compressed file content (without gzip header
+    and trailer, which are paid once per bundle, not per file).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    size = 0
+    with open(filename, 'rb') as file_data:
+        for chunk in iter(lambda: file_data.read(BUFFER_SIZE), b''):
+            size += len(compressor.compress(chunk))
+    return size + len(compressor.flush())
+
+
+def gzip_size(filenames, level=COMPRESS_LEVEL):
+    """
+    Returns size of gzip-compressed concatenation of files, joined same way
+    as bundle files are.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    size = 0
+    for filename in filenames:
+        last_byte = None
+        with open(filename, 'rb') as file_data:
+            for chunk in iter(lambda: file_data.read(BUFFER_SIZE), b''):
+                size += len(compressor.compress(chunk))
+                last_byte = chunk[-1:]
+        if last_byte not in (None, b'\n'):
+            size += len(compressor.compress(b'\n'))
+    return size + len(compressor.flush())
+
+
+def format_size(size):
+    """
+    Returns human-readable size.
+    """
+    if size < 1024:
+        return '{0} B'.format(size)
+    if size < 1024 * 1024:
+        return '{0:.1f} KB'.format(size / 1024.0)
+    return '{0:.1f} MB'.format(size / 1024.0 / 1024.0)
+
+
+def files_modules(config):
+    """
+    Returns dictionary of filename => name of module this file belongs to.
+    """
+    modules = {}
+    for name in sorted(config.modules.keys()):
+        module = config.modules[name]
+        files = list(module.css_files)
+        if module.js_file:
+            files.append(module.js_file)
+        for filename in files:
+            modules.setdefault(filename, name)
+    return modules
+
+
+class BundleSize(object):
+    """
+    Bundle size report.
+    """
+    bundle = None  # bundle object
+    files = None  # list of (filename, raw size, compressed size) tuples
+    modules = None  # list of (module name, raw size, compressed size) tuples
+    sizes = None  # dictionary of budget kind => size
+
+    def __init__(self, bundle, cache, bundles_cache, modules):
+        """
+        Files and modules compressed sizes are deflate sizes of every file
+        alone, they are for comparison only. Bundle gzip sizes are sizes of
+        whole compressed bundle files, as they are served.
+        """
+        self.bundle = bundle
+        self.files = []
+        self.sizes = dict((kind, 0) for kind in ('js', 'js_gzip',
+                                                 'css', 'css_gzip'))
+
+        modules_sizes = {}
+        for ext, files in (('js', bundle.js_files),
+                           ('css', bundle.css_files)):
+            for filename in files:
+                size, compressed = cache.get(filename)
+                self.files.append((filename, size, compressed))
+                self.sizes[ext] += size
+
+                module_name = modules.get(filename, '?')
+                module_size = modules_sizes.setdefault(module_name, [0, 0])
+                module_size[0] += size
+                module_size[1] += compressed
+
+            if files:
+                self.sizes[ext + '_gzip'] = bundles_cache.get_files(
+                    '{0}:{1}'.format(ext, bundle.name), files, gzip_size
+                )
+
+        self.files.sort(key=lambda item: (-item[1], item[0]))
+        self.modules = sorted(
+            [(name, size[0], size[1])
+             for name, size in modules_sizes.items()],
+            key=lambda item: (-item[1], item[0])
+        )
+
+    def exceeded(self):
+        """
+        Returns list of (budget kind, size, budget) for exceeded budgets.
+        """
+        return [
+            (kind, self.sizes[kind], budget)
+            for kind, budget in sorted(self.bundle.budget.items())
+            if self.sizes[kind] > budget
+        ]
+
+
+def bundles_sizes(config, bundle_names=None):
+    """
+    Returns list of bundles size reports (all bundles by default).
+    """
+    if bundle_names is None:
+        bundle_names = sorted(config.bundles.keys())
+
+    cache = FileCache('deflate_sizes', deflate_size, config.cache_dir)
+    bundles_cache = FileCache('gzip_sizes', None, config.cache_dir)
+    modules = files_modules(config)
+    try:
+        return [
+            BundleSize(config.bundles[name], cache, bundles_cache, modules)
+            for name in bundle_names
+        ]
+    finally:
+        cache.save()
+        bundles_cache.save()
@@ -0,0 +1,180 @@
+"""
+Templates compiler.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import pipes
+import subprocess
+
+from busta.bundle import deduplicate
+
+
+class TemplateException(Exception):
+    """
+    Template exception.
+    """
+    pass
+
+
+def compile_template(params):
+    """
+    Compile template file with compiler command (runs in process pool).
+    """
+    command, filename = params
+
+    try:
+        process = subprocess.Popen(
+            '{0} {1}'.format(command, pipes.quote(filename)),
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        stdout, stderr = process.communicate()
+    except OSError as exc:
+        return filename, None, str(exc)
+
+    if process.returncode != 0:
+        error = stderr.strip() or 'exit code {0}'.format(process.returncode)
+        return filename, None, error
+
+    return filename, stdout, None
+
+
+class TemplateCompiler(object):
+    """
+    Compile templates in process pool and cache compiled templates.
+    """
+    config = None  # config object
+    jobs = None  # number of compiler processes
+    compiled = None  # compiled templates dictionary
+    cache_files = None  # set of cache files of compiled templates
+
+    def __init__(self, config, jobs=None):
+        self.config = config
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.compiled = {}
+        self.cache_files = set()
+
+    @property
+    def cache_dir(self):
+        """
+        Returns compiled templates cache directory.
+        """
+        return os.path.join(self.config.cache_dir, 'templates')
+
+    def cache_file(self, filename):
+        """
+        Returns cache filename for compiled template.
+
+        Cache key depends on compiler command and template file size and
+        mtime, so changed template will never be taken from cache.
+        """
+        stat = os.stat(filename)
+        key = hashlib.sha1('\0'.join((
+            self.config.template_compiler,
+            filename,
+            str(stat.st_size),
+            repr(stat.st_mtime),
+        ))).hexdigest()
+        return os.path.join(self.cache_dir, key + '.js')
+
+    def compile(self, filenames):
+        """
+        Compile templates, skipping already compiled and cached ones.
+        """
+        missing = []
+        for filename in deduplicate(filenames):
+            if filename in self.compiled:
+                continue
+
+            cache_file = self.cache_file(filename)
+            self.cache_files.add(cache_file)
+            if os.path.isfile(cache_file):
+                with open(cache_file, 'rb') as cache_data:
+                    self.compiled[filename] = cache_data.read()
+            else:
+                missing.append((filename, cache_file))
+
+        if not missing:
+            return
+
+        pool = multiprocessing.Pool(min(self.jobs, len(missing)))
+        try:
+            results = pool.map(compile_template, [
+                (self.config.template_compiler, filename)
+                for filename, _ in missing
+            ])
+        finally:
+            pool.close()
+            pool.join()
+
+        errors = []
+        for (filename, cache_file), result in zip(missing, results):
+            output, error = result[1:]
+            if error is not None:
+                errors.append('{0}: {1}'.format(filename, error))
+                continue
+
+            self.compiled[filename] = output
+            TemplateCompiler.write_cache(cache_file, output)
+
+        if errors:
+            raise TemplateException(
+                "Error while compiling templates:\n{0}".format(
+                    '\n'.join(errors)
+                )
+            )
+
+    @staticmethod
+    def write_cache(cache_file, output):
+        """
+        Save compiled template into cache.
+        """
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        temp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        with open(temp_file, 'wb') as cache_data:
+            cache_data.write(output)
+        os.rename(temp_file, cache_file)
+
+    def prune(self):
+        """
+        Remove cached templates, not used by this compiler: every template
+        change leaves stale cache file (cache key depends on mtime).
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        for basename in os.listdir(self.cache_dir):
+            cache_file = os.path.join(self.cache_dir, basename)
+            if basename.endswith('.js') and cache_file not in self.cache_files:
+                try:
+                    os.unlink(cache_file)
+                except OSError:
+                    pass
+
+    def template_name(self, filename):
+        """
+        Returns template name: path relative to root dir without extension.
+        """
+        name = os.path.splitext(filename[len(self.config.root_dir):])[0]
+        return name.replace(os.path.sep, '/')
+
+    def write_bundle(self, bundle, output):
+        """
+        Write template bundle for bundle into output writer.
+        """
+        self.compile(bundle.template_files)
+
+        output.write(b'(function (templates) {\n')
+        for filename in bundle.template_files:
+            output.write('templates[{0}] = '.format(
+                json.dumps(self.template_name(filename))
+            ).encode('utf-8'))
+            output.write(self.compiled[filename].strip().rstrip(b';'))
+            output.write(b';\n')
+        output.write(b'})(window.templates = window.templates || {});\n')
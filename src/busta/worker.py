@@ -0,0 +1,413 @@
+"""
+Persistent processor workers.
+
+Worker is long-lived process, which reads jobs from stdin and writes results
+to stdout. Every message is two frames: JSON header and data, every frame is
+4-byte big-endian length followed by frame bytes. Worker must read whole
+job before writing its result.
+
+Job header is `{"type": "job", "ext": "js"}`, result header is `{"ok": true}`
+or `{"ok": false, "error": "message"}`. Health check job header is
+`{"type": "ping"}`, worker responds with `{"ok": true}` and empty data.
+
+Run `python -m busta.worker` for identity worker (returns data unchanged),
+or use `serve()` to write worker in Python.
+"""
+import json
+import multiprocessing
+import os
+import select
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from busta.writer import BUFFER_SIZE
+
+
+HEADER = struct.Struct('>I')  # frame length
+PING_TIMEOUT = 10.0  # seconds to wait for health check response
+STOP_TIMEOUT = 1.0  # seconds to wait for worker exit before killing it
+MAX_RETRIES = 1  # job retries on restarted worker after worker crash
+JOB_TIMEOUT = 600.0  # default seconds to wait for job result
+
+
+class WorkerException(Exception):
+    """
+    Worker exception.
+    """
+    pass
+
+
+class WorkerCrashed(WorkerException):
+    """
+    Worker process exited or closed its pipes.
+    """
+    pass
+
+
+class WorkerTimeout(WorkerException):
+    """
+    Worker did not finish job in time and was killed.
+    """
+    pass
+
+
+def kill_process(process):
+    """
+    Kill process with its process group (worker command is run by shell).
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        process.kill()
+
+
+def read_exactly(stream, size):
+    """
+    Read exactly `size` bytes from stream.
+    """
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError("Unexpected end of stream")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def write_frame(stream, data):
+    """
+    Write length-prefixed frame.
+    """
+    stream.write(HEADER.pack(len(data)))
+    stream.write(data)
+
+
+def read_frame(stream):
+    """
+    Read length-prefixed frame.
+    """
+    size = HEADER.unpack(read_exactly(stream, HEADER.size))[0]
+    return read_exactly(stream, size)
+
+
+def copy_frame(source, output, size):
+    """
+    Copy frame data of known size from source stream into output writer
+    through fixed-size buffer.
+    """
+    while size:
+        chunk = source.read(min(size, BUFFER_SIZE))
+        if not chunk:
+            raise EOFError("Unexpected end of stream")
+        output.write(chunk)
+        size -= len(chunk)
+
+
+class Worker(object):
+    """
+    Worker process.
+    """
+    command = None  # worker command
+    process = None  # worker process
+    stderr = None  # worker stderr temporary file
+    timed_out = None  # `True` if worker was killed by job timeout
+
+    def __init__(self, command):
+        self.command = command
+        self.process = None
+        self.stderr = None
+        self.timed_out = False
+
+    @property
+    def alive(self):
+        """
+        Returns `True` if worker process is running.
+        """
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """
+        Start worker process and check its health.
+        """
+        self.stop()
+
+        self.stderr = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                shell=True,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=self.stderr,
+                preexec_fn=getattr(os, 'setsid', None)
+            )
+        except OSError as exc:
+            raise WorkerException(
+                "Error while starting worker '{0}': {1}".format(
+                    self.command, exc
+                )
+            )
+
+        self.ping()
+
+    def stop(self):
+        """
+        Stop worker process: close its stdin and wait for exit, kill it if
+        it is still running after timeout.
+        """
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except (IOError, OSError):
+                pass
+            deadline = time.time() + STOP_TIMEOUT
+            while self.process.poll() is None and time.time() < deadline:
+                time.sleep(0.01)
+            if self.process.poll() is None:
+                kill_process(self.process)
+            self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+        if self.stderr is not None:
+            self.stderr.close()
+            self.stderr = None
+
+    def error_output(self):
+        """
+        Returns worker stderr output.
+        """
+        if self.stderr is None:
+            return ''
+        self.stderr.seek(0)
+        return self.stderr.read().strip()
+
+    def crashed(self, exc):
+        """
+        Returns exception for crashed worker.
+        """
+        if self.process is not None:
+            self.process.poll()
+        return WorkerCrashed("Worker '{0}' crashed: {1}".format(
+            self.command,
+            self.error_output() or exc or 'exit code {0}'.format(
+                self.process.returncode if self.process else None
+            )
+        ))
+
+    def request(self, header, data, size):
+        """
+        Send request: JSON header and data (string or file of known size).
+        """
+        try:
+            write_frame(self.process.stdin,
+                        json.dumps(header).encode('utf-8'))
+            self.process.stdin.write(HEADER.pack(size))
+            if isinstance(data, bytes):
+                self.process.stdin.write(data)
+            else:
+                for chunk in iter(lambda: data.read(BUFFER_SIZE), b''):
+                    self.process.stdin.write(chunk)
+            self.process.stdin.flush()
+        except (IOError, OSError) as exc:
+            raise self.crashed(exc)
+
+    def response(self, output):
+        """
+        Read response header and copy response data into output.
+        """
+        try:
+            header = json.loads(read_frame(self.process.stdout).decode(
+                'utf-8'
+            ))
+            size = HEADER.unpack(
+                read_exactly(self.process.stdout, HEADER.size)
+            )[0]
+            if header.get('ok'):
+                copy_frame(self.process.stdout, output, size)
+            else:
+                read_exactly(self.process.stdout, size)
+        except (IOError, OSError, EOFError, ValueError) as exc:
+            raise self.crashed(exc)
+
+        if not header.get('ok'):
+            raise WorkerException("Worker '{0}' failed: {1}".format(
+                self.command, header.get('error') or 'unknown error'
+            ))
+
+    def ping(self):
+        """
+        Check worker health: send ping and wait for response.
+        """
+        self.request({'type': 'ping'}, b'', 0)
+
+        ready = select.select([self.process.stdout], [], [], PING_TIMEOUT)[0]
+        if not ready:
+            self.stop()
+            raise WorkerCrashed(
+                "Worker '{0}' does not respond".format(self.command)
+            )
+
+        self.response(NullOutput())
+
+    def kill(self):
+        """
+        Kill hung worker process, blocked job reads and writes fail.
+        """
+        process = self.process
+        if process is not None and process.poll() is None:
+            self.timed_out = True
+            kill_process(process)
+
+    def run(self, stdin, output, ext, timeout=None):
+        """
+        Run job: send stdin file to worker and write result into output.
+
+        Worker is killed if job is not finished in `timeout` seconds.
+        """
+        if not self.alive:
+            self.start()
+
+        self.timed_out = False
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, self.kill)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            size = os.fstat(stdin.fileno()).st_size - stdin.tell()
+            self.request({'type': 'job', 'ext': ext}, stdin, size)
+            self.response(output)
+        except WorkerCrashed:
+            if self.timed_out:
+                self.stop()
+                raise WorkerTimeout(
+                    "Worker '{0}' job timed out after {1}s".format(
+                        self.command, timeout
+                    )
+                )
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+
+class NullOutput(object):
+    """
+    Output writer, which drops all data.
+    """
+    def write(self, data):
+        pass
+
+
+class WorkerPool(object):
+    """
+    Pool of persistent workers with same command.
+
+    Workers are started on first use. Crashed worker is restarted and job is
+    retried on it, if it was not already written to output. Hung worker is
+    killed after job timeout, job is not retried.
+    """
+    command = None  # worker command
+    size = None  # number of workers
+    timeout = None  # seconds to wait for job result
+    workers = None  # list of all workers
+    idle = None  # queue of idle workers
+    _lock = None
+
+    def __init__(self, command, size=None, timeout=None):
+        self.command = command
+        self.size = size or multiprocessing.cpu_count()
+        self.timeout = timeout or JOB_TIMEOUT
+        self.workers = []
+        self.idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Returns idle worker, starting new one if pool is not full.
+        """
+        with self._lock:
+            if self.idle.empty() and len(self.workers) < self.size:
+                worker = Worker(self.command)
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def process(self, stdin, output, ext):
+        """
+        Process stdin file with worker, write result into output.
+        """
+        start = stdin.tell()
+        written = getattr(output, 'size', None)
+
+        worker = self.acquire()
+        try:
+            retries = MAX_RETRIES
+            while True:
+                try:
+                    worker.run(stdin, output, ext, self.timeout)
+                    return
+                except WorkerCrashed:
+                    worker.stop()
+                    if not retries or getattr(output, 'size', None) != written:
+                        raise
+                    retries -= 1
+                    stdin.seek(start)
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        """
+        Stop all workers.
+        """
+        with self._lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            self.idle = queue.Queue()
+
+
+def serve(handler, stdin=None, stdout=None):
+    """
+    Run worker loop: `handler(data, ext)` returns processed data.
+    """
+    stdin = stdin or getattr(sys.stdin, 'buffer', sys.stdin)
+    stdout = stdout or getattr(sys.stdout, 'buffer', sys.stdout)
+
+    while True:
+        try:
+            header = json.loads(read_frame(stdin).decode('utf-8'))
+        except EOFError:
+            return
+        data = read_frame(stdin)
+
+        if header.get('type') == 'ping':
+            response, result = {'ok': True}, b''
+        else:
+            try:
+                response, result = {'ok': True}, handler(
+                    data, header.get('ext')
+                )
+            except Exception as exc:
+                response, result = {'ok': False, 'error': str(exc)}, b''
+
+        write_frame(stdout, json.dumps(response).encode('utf-8'))
+        write_frame(stdout, result)
+        stdout.flush()
+
+
+if __name__ == '__main__':
+    serve(lambda data, ext: data)
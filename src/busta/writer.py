@@ -0,0 +1,200 @@
+"""
+Bundle output files writer.
+"""
+import hashlib
+import os
+import tempfile
+
+
+BUFFER_SIZE = 65536  # read and write buffer size
+HASH_LENGTH = 12  # length of content hash in hashed filenames
+
+# process umask, temporary files are created with 0600 mode
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def file_digest(filename, buffer_size=BUFFER_SIZE):
+    """
+    Returns SHA1 hex digest of file content.
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as file_data:
+        for chunk in iter(lambda: file_data.read(buffer_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_dirs(directory):
+    """
+    Create directory with parents, if not exists.
+    """
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+
+def hashed_name(filename_format, digest):
+    """
+    Returns content-hashed filename.
+
+    :param filename_format: filename with '{0}' placeholder for hash
+    """
+    return filename_format.format(digest[:HASH_LENGTH])
+
+
+class StreamWriter(object):
+    """
+    Write data into file object, counting size and digest on the fly.
+    """
+    file = None  # file object
+    buffer_size = None  # buffer size for copying streams
+    size = None  # size of written data
+    last_byte = None  # last written byte
+    _digest = None
+
+    def __init__(self, file_obj, buffer_size=BUFFER_SIZE):
+        self.file = file_obj
+        self.buffer_size = buffer_size
+        self.size = 0
+        self.last_byte = None
+        self._digest = hashlib.sha1()
+
+    @property
+    def digest(self):
+        """
+        Returns SHA1 hex digest of written data.
+        """
+        return self._digest.hexdigest()
+
+    def write(self, data):
+        """
+        Write data chunk.
+        """
+        if not data:
+            return
+        self.file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+        self.last_byte = data[-1:]
+
+    def copy(self, stream):
+        """
+        Copy stream into file through fixed-size buffer.
+        """
+        for chunk in iter(lambda: stream.read(self.buffer_size), b''):
+            self.write(chunk)
+
+    def copy_file(self, filename):
+        """
+        Copy file content into file through fixed-size buffer.
+        """
+        with open(filename, 'rb') as file_data:
+            self.copy(file_data)
+
+
+class OutputWriter(StreamWriter):
+    """
+    Atomic output file writer, use it as context manager.
+
+    Data is written into temporary file in output directory, which is renamed
+    to output file on success. If output file already has same content, it is
+    left untouched (keeping its mtime) and temporary file is removed.
+    """
+    filename = None  # output filename
+    changed = None  # `True` if output file was changed
+    _temp_file = None
+
+    def __init__(self, filename, buffer_size=BUFFER_SIZE):
+        self.filename = filename
+        self.changed = None
+        self._temp_file = None
+        StreamWriter.__init__(self, None, buffer_size=buffer_size)
+
+    def __enter__(self):
+        directory = os.path.dirname(self.temp_name)
+        make_dirs(directory)
+
+        handle, self._temp_file = tempfile.mkstemp(
+            dir=directory,
+            prefix='.{0}.'.format(os.path.basename(self.temp_name)),
+            suffix='.tmp'
+        )
+        self.file = os.fdopen(handle, 'wb')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.file.close()
+            if exc_type is None:
+                self.commit()
+        finally:
+            if os.path.exists(self._temp_file):
+                os.unlink(self._temp_file)
+
+    @property
+    def temp_name(self):
+        """
+        Returns filename, used for temporary file directory and prefix.
+        """
+        return self.filename
+
+    def unchanged(self):
+        """
+        Returns `True` if output file already has written content.
+        """
+        try:
+            if os.path.getsize(self.filename) != self.size:
+                return False
+            return file_digest(self.filename, self.buffer_size) == self.digest
+        except (IOError, OSError):
+            return False
+
+    def commit(self):
+        """
+        Replace output file with temporary file, if content is changed.
+        """
+        if self.unchanged():
+            self.changed = False
+            return
+
+        os.chmod(self._temp_file, 0o666 & ~UMASK)
+        os.rename(self._temp_file, self.filename)
+        self.changed = True
+
+
+class HashedOutputWriter(OutputWriter):
+    """
+    Atomic writer into content-hashed output file, use it as context manager.
+
+    Output filename is known only after all data is written. Existing file
+    with same name already has same content, so it is left untouched.
+    """
+    filename_format = None  # filename with '{0}' placeholder for hash
+
+    def __init__(self, filename_format, buffer_size=BUFFER_SIZE):
+        OutputWriter.__init__(self, None, buffer_size=buffer_size)
+        self.filename_format = filename_format
+
+    @property
+    def temp_name(self):
+        """
+        Returns filename, used for temporary file directory and prefix.
+        """
+        return hashed_name(self.filename_format, 'hash')
+
+    def unchanged(self):
+        """
+        Returns `True` if output file already exists.
+        """
+        return os.path.isfile(self.filename)
+
+    def commit(self):
+        """
+        Rename temporary file to content-hashed output file.
+        """
+        self.filename = hashed_name(self.filename_format, self.digest)
+        OutputWriter.commit(self)
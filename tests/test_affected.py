@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import unittest
+
+from busta.affected import AffectedIndex
+from busta.command_line import affected_command
+from busta.config import Config
+from tests.utils import ProjectTestCase
+
+
+class AffectedIndexTest(ProjectTestCase):
+    def make_config(self, **params):
+        self.write('jquery.js', 'var $ = 1;\n')
+        self.write('vendor/jquery.js', 'var $ = 1;\n')
+        self.write('app/app.js', 'require("jquery");\nvar app;\n')
+        self.write('app/app.css', '.app {}\n')
+        return self.config(
+            {'jquery': 'jquery', 'vendor': 'vendor/jquery', 'app': 'app'},
+            {'common': {'modules': ['jquery']},
+             'main': {'modules': ['app', 'vendor'], 'exclude': ['common']}},
+            **params
+        )
+
+    def affected(self, config, *filenames):
+        return AffectedIndex(config).affected(
+            [self.path('src', filename) for filename in filenames]
+        )
+
+    def test_bundle_files(self):
+        config = self.make_config()
+        self.assertEqual(self.affected(config, 'jquery.js'), ['common'])
+        self.assertEqual(self.affected(config, 'app/app.js'), ['main'])
+        self.assertEqual(self.affected(config, 'app/new.css'), ['main'])
+        self.assertEqual(self.affected(config, 'unknown.js'), [])
+
+    def test_config_file(self):
+        config = self.make_config()
+        self.assertEqual(
+            AffectedIndex(config).affected([config.config_file]),
+            ['common', 'main']
+        )
+
+    def test_content_duplicate(self):
+        config = self.make_config(deduplicate_content=True)
+        self.assertNotIn(self.path('src', 'vendor/jquery.js'),
+                         config.bundles['main'].js_files)
+        self.assertEqual(self.affected(config, 'vendor/jquery.js'), ['main'])
+
+
+class DependentsTest(ProjectTestCase):
+    """
+    Transitive dependencies: 'app' => 'lib' => 'core'.
+    """
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        self.write('core/core.js', 'var core;\n')
+        self.write('lib/lib.js', 'require("core");\n')
+        self.write('app/app.js', 'require("lib");\n')
+        self.write('other/other.js', 'var other;\n')
+        self.config(
+            {'core': 'core', 'lib': 'lib', 'app': 'app', 'other': 'other'},
+            {'core': {'modules': ['core']},
+             'lib': {'modules': ['lib']},
+             'app': {'modules': ['app']},
+             'site': {'modules': ['app'], 'exclude': ['core']},
+             'other': {'modules': ['other']}}
+        )
+
+    def affected(self, *filenames):
+        config = Config(self.path('busta.json'))
+        return AffectedIndex(config).affected(
+            [self.path('src', filename) for filename in filenames]
+        )
+
+    def test_transitive_dependents(self):
+        self.assertEqual(self.affected('core/core.js'),
+                         ['app', 'core', 'lib'])
+        self.assertEqual(self.affected('lib/lib.js'), ['app', 'lib', 'site'])
+        self.assertEqual(self.affected('app/app.js'), ['app', 'site'])
+
+    def test_new_file(self):
+        self.assertEqual(self.affected('core/new.js'), ['app', 'core', 'lib'])
+        self.assertEqual(self.affected('lib/deep/sub/new.css'),
+                         ['app', 'lib', 'site'])
+        self.assertEqual(self.affected('other/new.js'), ['other'])
+        self.assertEqual(self.affected('new/new.js'), [])
+
+    def test_removed_file(self):
+        os.remove(self.path('src', 'lib', 'lib.js'))
+        self.assertEqual(self.affected('lib/lib.js'), ['app', 'lib', 'site'])
+
+    def test_command(self):
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin = io.StringIO(u'\n'.join([
+            self.path('src', 'other', 'other.js'),
+            u'',
+            self.path('src', 'core', 'new.js'),
+        ]) + u'\n')
+        sys.stdout = io.StringIO()
+        try:
+            affected_command([self.path('busta.json')])
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+        self.assertEqual(output, 'app\ncore\nlib\nother\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
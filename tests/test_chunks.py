@@ -0,0 +1,95 @@
+import distutils.spawn
+import json
+import subprocess
+import unittest
+
+from busta.chunks import bundle_chunks, chunks_manifest, loader_script
+from tests.utils import ProjectTestCase
+
+
+NODE = distutils.spawn.find_executable('node')
+
+# fake DOM: every appended script is "loaded" asynchronously
+DOM_JS = """
+var loaded = [];
+var window = {};
+var document = {
+    currentScript: null,
+    getElementsByTagName: function () {
+        return [{appendChild: function (script) {
+            loaded.push(script.src);
+            setTimeout(function () { script.onload({type: 'load'}); }, 0);
+        }}];
+    },
+    createElement: function () { return {}; }
+};
+"""
+
+
+class BundleChunksTest(ProjectTestCase):
+    def make_config(self):
+        self.write('jquery.js', 'var $;\n')
+        self.write('lib.js', 'var lib;\n')
+        self.write('shared/shared.js', 'require("lib");\nvar shared;\n')
+        self.write('editor/editor.js',
+                   'require("jquery");\nrequire("shared");\nvar editor;\n')
+        self.write('gallery/gallery.js', 'require("shared");\nvar gallery;\n')
+        self.write('app/app.js', 'var app;\n')
+        return self.config(
+            {'jquery': 'jquery', 'lib': 'lib', 'shared': 'shared',
+             'editor': 'editor', 'gallery': 'gallery', 'app': 'app'},
+            {'common': {'modules': ['jquery']},
+             'main': {'modules': ['app'], 'exclude': ['common'],
+                      'async': ['editor', 'gallery']}}
+        )
+
+    def rel(self, files):
+        return [filename[len(self.path('src')) + 1:] for filename in files]
+
+    def test_chunks(self):
+        bundle = self.make_config().bundles['main']
+        chunks = bundle_chunks(bundle)
+
+        self.assertEqual(
+            [(chunk.name, self.rel(chunk.js_files)) for chunk in chunks],
+            [('editor~gallery', ['lib.js', 'shared/shared.js']),
+             ('editor', ['editor/editor.js']),
+             ('gallery', ['gallery/gallery.js'])]
+        )
+        self.assertEqual(chunks_manifest(bundle, chunks), {'entries': {
+            'editor': ['main.chunk.editor~gallery.js', 'main.chunk.editor.js'],
+            'gallery': ['main.chunk.editor~gallery.js',
+                        'main.chunk.gallery.js'],
+        }})
+
+    def test_excluded_bundle_files(self):
+        bundle = self.make_config().bundles['main']
+        for chunk in bundle_chunks(bundle):
+            self.assertNotIn(self.path('src', 'jquery.js'), chunk.js_files)
+
+    @unittest.skipIf(NODE is None, 'node is not installed')
+    def test_loaders_share_registry(self):
+        script = DOM_JS
+        for base, manifest in (
+            ('/a/', {'entries': {'editor': ['a.chunk.x.js', 'a.chunk.y.js']}}),
+            ('/b/', {'entries': {'gallery': ['b.chunk.x.js']}}),
+        ):
+            script += "document.currentScript = {{src: '{0}loader.js'}};\n" \
+                .format(base)
+            script += loader_script(manifest)
+        script += """
+window.busta.load('editor', function (error) {
+    window.busta.load('gallery', function (error2) {
+        console.log(JSON.stringify([error, error2, loaded]));
+    });
+});
+"""
+        output = subprocess.check_output([NODE, '-e', script])
+        self.assertEqual(json.loads(output.decode('utf-8')), [
+            None, None,
+            ['/a/a.chunk.x.js', '/a/a.chunk.y.js', '/b/b.chunk.x.js']
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
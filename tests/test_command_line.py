@@ -0,0 +1,120 @@
+# coding: utf-8
+import io
+import json
+import sys
+import unittest
+
+from busta.command_line import (DRAW_SEEN, OUTPUT_BUFFER_SIZE, TextOutput,
+                                list_command, print_js_dependencies)
+from tests.utils import ProjectTestCase
+
+
+class Stdout(object):
+    """
+    Fake stdout with binary buffer.
+    """
+    encoding = 'utf-8'
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+
+class TextOutputTest(unittest.TestCase):
+    def test_buffered(self):
+        stream = io.BytesIO()
+        out = TextOutput(stream)
+        out.line(u'─── a')
+        out.write(b'b')
+        self.assertEqual(stream.getvalue(), b'')
+        out.flush()
+        self.assertEqual(stream.getvalue(), u'─── a\nb'.encode('utf-8'))
+
+    def test_flush_on_buffer_size(self):
+        stream = io.BytesIO()
+        out = TextOutput(stream)
+        out.write('x' * (OUTPUT_BUFFER_SIZE - 1))
+        self.assertEqual(stream.getvalue(), b'')
+        out.write('yz')
+        self.assertEqual(len(stream.getvalue()), OUTPUT_BUFFER_SIZE + 1)
+        self.assertEqual(out.chunks, [])
+
+
+class ListTest(ProjectTestCase):
+    """
+    Shared dependencies: 'app' => 'a', 'b'; 'a', 'b' => 'c' => 'd'.
+    """
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        self.write('d.js', 'var d;\n')
+        self.write('c.js', 'require("d");\n')
+        self.write('a.js', 'require("c");\n')
+        self.write('b.js', 'require("c");\n')
+        self.write('app/app.js', 'require("a");\nrequire("b");\n')
+        self.write('app/app.css', '.app {}\n')
+        self.config(
+            {'app': 'app', 'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'},
+            {'main': {'modules': ['app'], 'exclude': ['lib']},
+             'lib': {'modules': ['d']}}
+        )
+
+    def run_list(self, *args):
+        stdout = sys.stdout
+        sys.stdout = Stdout()
+        try:
+            list_command([self.path('busta.json')] + list(args))
+            return sys.stdout.buffer.getvalue().decode('utf-8')
+        finally:
+            sys.stdout = stdout
+
+    def test_shared_dependencies_expanded_once(self):
+        from busta.config import Config
+
+        config = Config(self.path('busta.json'))
+        stream = io.BytesIO()
+        out = TextOutput(stream)
+        print_js_dependencies(config.modules['app'], out, set(), padding=2)
+        out.flush()
+        self.assertEqual(stream.getvalue().decode('utf-8').splitlines(), [
+            u'  ├── a.js',
+            u'  │   └── c.js',
+            u'  │       └── d.js',
+            u'  └── b.js',
+            u'      └── c.js' + DRAW_SEEN,
+        ])
+
+    def test_verbose_list(self):
+        output = self.run_list('-vvv')
+        # subtrees are expanded once in whole modules list
+        self.assertIn(u'\n'.join([
+            u'    JS ─── a.js',
+            u'           └── c.js',
+            u'               └── d.js',
+        ]), output)
+        self.assertIn(u'\n'.join([
+            u'    JS ─── app/app.js',
+            u'           ├── a.js',
+            u'           │   └── c.js' + DRAW_SEEN,
+            u'           └── b.js',
+            u'               └── c.js' + DRAW_SEEN,
+            u'   CSS ─── app/app.css',
+        ]), output)
+
+    def test_json_list(self):
+        data = json.loads(self.run_list('--format', 'json'))
+        self.assertEqual(sorted(data['modules']), ['a', 'app', 'b', 'c', 'd'])
+        self.assertEqual(data['modules']['app'], {
+            'path': 'app',
+            'js_file': 'app/app.js',
+            'css_files': ['app/app.css'],
+            'template_files': [],
+            'js_dependencies': ['a', 'b'],
+        })
+        self.assertEqual(data['bundles']['main']['js_files'],
+                         ['c.js', 'a.js', 'b.js', 'app/app.js'])
+        self.assertEqual(data['bundles']['main']['exclude'], ['lib'])
+        self.assertEqual(data['bundles']['lib']['outputs'],
+                         {'js': data['output_dir'] + 'lib.js'})
+
+
+if __name__ == '__main__':
+    unittest.main()
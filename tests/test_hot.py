@@ -0,0 +1,274 @@
+import distutils.spawn
+import json
+import socket
+import subprocess
+import threading
+import unittest
+
+from busta.build import Builder
+from busta.hot import (CLIENT_JS, EVENTS_PATH, FILE_PATH, HotServer,
+                       file_message, file_source)
+from tests.utils import ProjectTestCase
+
+
+NODE = distutils.spawn.find_executable('node')
+
+# fake DOM with stylesheets and EventSource, which delivers messages one by one
+DOM_JS = """
+var reloaded = false;
+function Node(tag, attrs) {
+    this.tag = tag;
+    this.attrs = {};
+    this.children = [];
+    for (var name in attrs) { this[name] = attrs[name]; }
+}
+Node.prototype.setAttribute = function (name, value) {
+    this.attrs[name] = value;
+};
+Node.prototype.getAttribute = function (name) {
+    return this.attrs.hasOwnProperty(name) ? this.attrs[name] : null;
+};
+Node.prototype.cloneNode = function () {
+    return new Node(this.tag, {rel: this.rel, href: this.href});
+};
+Node.prototype.appendChild = function (node) { this.children.push(node); };
+Node.prototype.insertBefore = function (node, next) {
+    this.children.splice(this.children.indexOf(next), 0, node);
+    node.parentNode = this;
+    if (node.tag === 'link') {
+        setTimeout(function () { node.onload(); }, 0);
+    }
+};
+Node.prototype.removeChild = function (node) {
+    this.children.splice(this.children.indexOf(node), 1);
+};
+Node.prototype.replaceChild = function (node, old) {
+    this.children[this.children.indexOf(old)] = node;
+    node.parentNode = this;
+};
+var head = new Node('head');
+LINKS.forEach(function (href) {
+    var link = new Node('link', {rel: 'stylesheet', href: href});
+    link.parentNode = head;
+    head.children.push(link);
+});
+var document = {
+    currentScript: {src: 'http://hot/busta/hmr.js'},
+    getElementsByTagName: function (tag) {
+        return head.children.filter(function (node) {
+            return node.tag === tag;
+        });
+    },
+    createElement: function (tag) { return new Node(tag); },
+    createTextNode: function (text) { return text; }
+};
+var window = {
+    location: {reload: function () { reloaded = true; }},
+    EventSource: function () {
+        var source = this;
+        MESSAGES.forEach(function (message, i) {
+            setTimeout(function () {
+                source.onmessage({data: JSON.stringify(message)});
+            }, 5 * i);
+        });
+    }
+};
+"""
+
+
+class FileMessageTest(ProjectTestCase):
+    def make_config(self, **bundle_params):
+        self.write('app/app.js', 'var app;\n')
+        self.write('app/app.css', '.app {}\n')
+        self.write('app/theme.css', '.theme {}\n')
+        bundle = {'modules': ['app']}
+        bundle.update(bundle_params)
+        return self.config({'app': 'app'}, {'main': bundle})
+
+    def test_css_message(self):
+        config = self.make_config()
+        builder = Builder(config)
+        builder.build()
+        message = file_message(config, config, builder,
+                               self.path('src', 'app', 'app.css'))
+        self.assertEqual(message['type'], 'css')
+        self.assertEqual(message['file'], 'app/app.css')
+        self.assertEqual(message['code'], '.app {}\n')
+        self.assertEqual(message['outputs'], {
+            'main.css': ['app/app.css', 'app/theme.css'],
+        })
+
+    def test_unbundled_css_message(self):
+        config = self.make_config(output='unbundled')
+        builder = Builder(config)
+        builder.build()
+        message = file_message(config, config, builder,
+                               self.path('src', 'app', 'theme.css'))
+        outputs = sorted(message['outputs'].items())
+        self.assertEqual([files for output, files in outputs],
+                         [['app/app.css'], ['app/theme.css']])
+        self.assertTrue(outputs[1][0].startswith('modules/app/theme.'))
+
+    def test_file_source(self):
+        config = self.make_config()
+        self.assertEqual(file_source(config, 'app/theme.css'), '.theme {}\n')
+        self.assertIsNone(file_source(config, 'app/app.js'))
+        self.assertIsNone(file_source(config, '../busta.json'))
+        self.assertIsNone(file_source(config, 'app/missing.css'))
+
+    def test_js_message(self):
+        config = self.make_config()
+        builder = Builder(config)
+        builder.build()
+        message = file_message(config, config, builder,
+                               self.path('src', 'app', 'app.js'))
+        self.assertEqual(message['type'], 'js')
+        self.assertEqual(message['modules'], ['app'])
+        self.assertEqual(message['code'], 'var app;\n')
+
+    def test_removed_file(self):
+        config = self.make_config()
+        message = file_message(config, config, Builder(config),
+                               self.path('src', 'app', 'removed.css'))
+        self.assertEqual(message, {'type': 'reload'})
+
+
+@unittest.skipIf(NODE is None, 'node is not installed')
+class ClientTest(unittest.TestCase):
+    LINKS = [
+        'http://x/out/main.css',
+        'http://x/out/modules/lib/a.0123456789ab.css',
+        'http://x/out/other.css',
+    ]
+
+    def run_client(self, *messages):
+        script = 'var LINKS = {0}, MESSAGES = {1};\n'.format(
+            json.dumps(self.LINKS), json.dumps(messages)
+        )
+        script += DOM_JS + CLIENT_JS + """
+setTimeout(function () {
+    console.log(JSON.stringify({
+        reloaded: reloaded,
+        head: head.children.map(function (node) {
+            if (node.tag !== 'style') {
+                return node.href;
+            }
+            return [node.getAttribute('data-busta-file'),
+                    node.children.join('')];
+        })
+    }));
+}, 50);
+"""
+        output = subprocess.check_output([NODE, '-e', script])
+        return json.loads(output.decode('utf-8'))
+
+    def css(self, filename, code, outputs):
+        return {'type': 'css', 'file': filename, 'code': code,
+                'outputs': outputs}
+
+    def test_bundle_stylesheet_split(self):
+        result = self.run_client(self.css(
+            'app/b.css', '.b { color: red }',
+            {'main.css': ['app/a.css', 'app/b.css', 'app/c.css']}
+        ))
+        self.assertEqual(result, {'reloaded': False, 'head': [
+            'http://hot/busta/file?name=app%2Fa.css',
+            ['app/b.css', '.b { color: red }'],
+            'http://hot/busta/file?name=app%2Fc.css',
+            'http://x/out/modules/lib/a.0123456789ab.css',
+            'http://x/out/other.css',
+        ]})
+
+    def test_changed_file_replaced(self):
+        outputs = {'main.css': ['app/a.css', 'app/b.css']}
+        result = self.run_client(
+            self.css('app/b.css', '.b { color: red }', outputs),
+            self.css('app/a.css', '.a {}', outputs),
+            self.css('app/b.css', '.b { color: blue }', outputs),
+        )
+        self.assertEqual(result, {'reloaded': False, 'head': [
+            ['app/a.css', '.a {}'],
+            ['app/b.css', '.b { color: blue }'],
+            'http://x/out/modules/lib/a.0123456789ab.css',
+            'http://x/out/other.css',
+        ]})
+
+    def test_unbundled_stylesheet_replaced(self):
+        result = self.run_client(self.css(
+            'lib/a.css', '.a {}',
+            {'modules/lib/a.ba9876543210.css': ['lib/a.css'],
+             'modules/app/a.ba9876543210.css': ['app/a.css']}
+        ))
+        self.assertEqual(result['head'][1], ['lib/a.css', '.a {}'])
+        self.assertEqual(len(result['head']), 3)
+        self.assertFalse(result['reloaded'])
+
+    def test_unknown_stylesheet_reloads(self):
+        result = self.run_client(self.css('x.css', '', {'x.css': ['x.css']}))
+        self.assertTrue(result['reloaded'])
+
+    def test_not_accepted_js_reloads(self):
+        result = self.run_client({'type': 'js', 'modules': ['app'],
+                                  'file': 'app.js', 'code': 'var a;'})
+        self.assertTrue(result['reloaded'])
+
+
+class HotServerTest(ProjectTestCase):
+    def start(self, config=None):
+        server = HotServer(('127.0.0.1', 0), config)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server, thread
+
+    def get(self, server, path):
+        client = socket.create_connection(server.server_address)
+        client.sendall('GET {0} HTTP/1.0\r\n\r\n'.format(path)
+                       .encode('ascii'))
+        response = b''
+        for chunk in iter(lambda: client.recv(4096), b''):
+            response += chunk
+        client.close()
+        return response.split(b' ', 2)[1], response.split(b'\r\n\r\n')[1]
+
+    def test_file(self):
+        self.write('app/app.css', '.app {}\n')
+        config = self.config({'app': 'app'}, {'main': {'modules': ['app']}})
+        server, thread = self.start(config)
+        try:
+            self.assertEqual(
+                self.get(server, FILE_PATH + '?name=app%2Fapp.css'),
+                (b'200', b'.app {}\n')
+            )
+            self.assertEqual(
+                self.get(server, FILE_PATH + '?name=busta.json')[0], b'404'
+            )
+        finally:
+            server.stop()
+
+    def test_push_and_stop(self):
+        server, thread = self.start()
+
+        client = socket.create_connection(server.server_address)
+        client.sendall('GET {0} HTTP/1.0\r\n\r\n'.format(EVENTS_PATH)
+                       .encode('ascii'))
+        stream = client.makefile('rb')
+        while stream.readline().strip():
+            pass
+        while not server.clients:
+            pass
+
+        server.push({'type': 'reload'})
+        self.assertEqual(stream.readline(), b'data: {"type": "reload"}\n')
+
+        server.stop()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(server.clients, [])
+        stream.readline()
+        self.assertEqual(stream.read(), b'')
+        client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
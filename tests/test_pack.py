@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+
+from busta.build import Builder
+from busta.pack import PackException, PackReader, PackWriter
+from tests.utils import ProjectTestCase
+
+
+class PackTest(ProjectTestCase):
+    def make_outputs(self):
+        outputs = []
+        for index, data in enumerate(['var a;\n' * 100, 'x', 'body {}\n']):
+            ext = 'css' if index == 2 else 'js'
+            filename = self.path('out', 'f{0}.{1}'.format(index, ext))
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as file_data:
+                file_data.write(data)
+            outputs.append(filename)
+        return outputs
+
+    def pack(self, filename, outputs):
+        with PackWriter(self.path('out', filename)) as pack:
+            for output in outputs:
+                pack.add(output)
+        with open(self.path('out', filename), 'rb') as pack_data:
+            return pack_data.read()
+
+    def test_deterministic(self):
+        outputs = self.make_outputs()
+        data = self.pack('a.pack', outputs)
+        self.assertEqual(self.pack('b.pack', list(reversed(outputs))), data)
+        self.assertEqual(self.pack('c.pack', outputs[1:] + outputs[:1]), data)
+
+    def test_round_trip(self):
+        outputs = self.make_outputs()
+        self.pack('app.pack', outputs + outputs[:1])
+        self.assertEqual(sorted(os.listdir(self.path('out'))), [
+            'app.pack', 'f0.js', 'f1.js', 'f2.css',
+        ])
+
+        with PackReader(self.path('out', 'app.pack')) as reader:
+            self.assertEqual(sorted(reader.entries), [
+                'f0.js', 'f0.js.gz', 'f1.js', 'f2.css',
+            ])
+
+            entry = reader.get('f0.js')
+            self.assertEqual(entry.content_type, 'application/javascript')
+            self.assertEqual(reader.read(entry), b'var a;\n' * 100)
+            self.assertEqual(reader.read(entry, 4, 6), b'a;')
+            self.assertEqual(entry.digest,
+                             hashlib.sha1(b'var a;\n' * 100).hexdigest())
+
+            entry = reader.get('f0.js', gzip=True)
+            self.assertEqual(entry.name, 'f0.js.gz')
+            stream = gzip.GzipFile(fileobj=io.BytesIO(reader.read(entry)))
+            self.assertEqual(stream.read(), b'var a;\n' * 100)
+
+            # small output has no compressed variant
+            self.assertEqual(reader.get('f1.js', gzip=True).name, 'f1.js')
+            self.assertEqual(reader.get('f2.css').content_type, 'text/css')
+            self.assertIsNone(reader.get('missing.js'))
+
+            with tempfile.TemporaryFile() as target:
+                entry = reader.get('f2.css')
+                self.assertEqual(reader.send(target.fileno(), entry, 2),
+                                 entry.length - 2)
+                target.seek(0)
+                self.assertEqual(target.read(), b'dy {}\n')
+
+    def test_failed_pack_not_written(self):
+        outputs = self.make_outputs()
+        with self.assertRaises(ValueError):
+            with PackWriter(self.path('out', 'app.pack')) as pack:
+                pack.add(outputs[0])
+                raise ValueError()
+        self.assertEqual(sorted(os.listdir(self.path('out'))), [
+            'f0.js', 'f1.js', 'f2.css',
+        ])
+
+    def test_changed_output(self):
+        outputs = self.make_outputs()
+        with self.assertRaises(PackException):
+            with PackWriter(self.path('out', 'app.pack')) as pack:
+                pack.add(outputs[0])
+                with open(outputs[0], 'w') as file_data:
+                    file_data.write('changed')
+        self.assertFalse(os.path.exists(self.path('out', 'app.pack')))
+
+    def test_relative_filename(self):
+        outputs = self.make_outputs()
+        cwd = os.getcwd()
+        os.chdir(self.path('out'))
+        try:
+            with PackWriter('app.pack') as pack:
+                pack.add(outputs[1])
+        finally:
+            os.chdir(cwd)
+        with PackReader(self.path('out', 'app.pack')) as reader:
+            self.assertEqual(list(reader.entries), ['f1.js'])
+
+    def test_not_a_pack(self):
+        outputs = self.make_outputs()
+        with self.assertRaises(PackException):
+            PackReader(outputs[0])
+
+
+class BuildPackTest(ProjectTestCase):
+    def test_build_deterministic(self):
+        modules = {}
+        for index in range(12):
+            name = 'm{0}'.format(index)
+            self.write('{0}/{0}.js'.format(name), 'var {0};\n'.format(name))
+            self.write('{0}/{0}.css'.format(name), '.{0} {{}}\n'.format(name))
+            modules[name] = name
+        config = self.config(modules, dict(
+            (name, {'modules': [name]}) for name in modules
+        ))
+
+        packs = []
+        for jobs in (1, 8, 8):
+            filename = self.path('out', 'app.{0}.pack'.format(len(packs)))
+            with PackWriter(filename) as pack:
+                Builder(config, jobs=jobs, pack=pack).build()
+            with PackReader(filename) as reader:
+                self.assertEqual(len(reader.entries), 24)
+                self.assertEqual(reader.read(reader.get('m3.css')),
+                                 b'.m3 {}\n')
+            with open(filename, 'rb') as pack_data:
+                packs.append(pack_data.read())
+
+        self.assertEqual(packs[1], packs[0])
+        self.assertEqual(packs[2], packs[0])
@@ -0,0 +1,72 @@
+import json
+import os
+
+from busta.build import Builder
+from tests.utils import ProjectTestCase
+
+
+class BuildPartsTest(ProjectTestCase):
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        for index in range(4):
+            self.write('m{0}.js'.format(index), 'var m{0};\n'.format(index))
+
+    def make_config(self, max_size=None):
+        bundle = {'modules': ['m{0}'.format(index) for index in range(4)]}
+        if max_size:
+            bundle['max_size'] = max_size
+        return self.config(
+            dict(('m{0}'.format(index), 'm{0}'.format(index))
+                 for index in range(4)),
+            {'main': bundle}
+        )
+
+    def outputs(self):
+        return sorted(os.listdir(self.path('out')))
+
+    def test_parts(self):
+        Builder(self.make_config(16)).build()
+        self.assertEqual(self.outputs(), [
+            'main.1.js', 'main.2.js', 'main.parts.json',
+        ])
+        self.assertEqual(self.read('out', 'main.1.js'), 'var m0;\nvar m1;\n')
+        self.assertEqual(json.loads(self.read('out', 'main.parts.json')),
+                         {'js': ['main.1.js', 'main.2.js']})
+
+    def test_stale_parts_removed(self):
+        Builder(self.make_config(8)).build()
+        self.assertEqual(self.outputs(), [
+            'main.1.js', 'main.2.js', 'main.3.js', 'main.4.js',
+            'main.parts.json',
+        ])
+
+        with open(self.path('out', 'main.js'), 'w') as file_data:
+            file_data.write('var old;\n')
+        with open(self.path('out', 'mainline.1.js'), 'w') as file_data:
+            file_data.write('var other;\n')
+
+        Builder(self.make_config(16)).build()
+        self.assertEqual(self.outputs(), [
+            'main.1.js', 'main.2.js', 'main.parts.json', 'mainline.1.js',
+        ])
+        self.assertEqual(json.loads(self.read('out', 'main.parts.json')),
+                         {'js': ['main.1.js', 'main.2.js']})
+
+    def test_parts_removed_without_max_size(self):
+        Builder(self.make_config(8)).build()
+        Builder(self.make_config()).build()
+        self.assertEqual(self.outputs(), ['main.js'])
+
+    def test_earlier_parts_kept(self):
+        Builder(self.make_config(16)).build()
+        os.utime(self.path('out', 'main.1.js'), (1, 1))
+        os.utime(self.path('out', 'main.2.js'), (1, 1))
+
+        self.write('m3.js', 'var m9;\n')
+        builder = Builder(self.make_config(16))
+        builder.build()
+        self.assertEqual(builder.changed, [self.path('out', 'main.2.js')])
+        self.assertEqual(self.read('out', 'main.1.js'), 'var m0;\nvar m1;\n')
+        self.assertEqual(os.path.getmtime(self.path('out', 'main.1.js')), 1)
+        self.assertEqual(self.read('out', 'main.2.js'),
+                         'var m2;\nvar m9;\n')
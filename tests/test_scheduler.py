@@ -0,0 +1,137 @@
+import threading
+import unittest
+
+from busta.build import Builder
+from busta.scheduler import Scheduler, SchedulerException, Task
+from tests.utils import ProjectTestCase
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.order = []
+        self.lock = threading.Lock()
+
+    def task(self, name, deps=None, estimate=0.0, fail=False):
+        def func():
+            with self.lock:
+                self.order.append(name)
+            if fail:
+                raise ValueError('task failed')
+            return name.upper()
+        return Task(name, func, deps, estimate)
+
+    def test_results(self):
+        scheduler = Scheduler([self.task('a'), self.task('b', ['a'])], jobs=4)
+        self.assertEqual(scheduler.run(), {'a': 'A', 'b': 'B'})
+        self.assertIsNotNone(scheduler.tasks['a'].duration)
+
+    def test_dependencies_order(self):
+        tasks = [
+            self.task('resolve'),
+            self.task('js', ['resolve']),
+            self.task('css', ['resolve']),
+            self.task('preload', ['js', 'css']),
+        ]
+        Scheduler(tasks, jobs=4).run()
+        self.assertEqual(self.order[0], 'resolve')
+        self.assertEqual(self.order[-1], 'preload')
+
+    def test_critical_path_first(self):
+        tasks = [
+            self.task('short', estimate=5.0),
+            self.task('head', estimate=1.0),
+            self.task('tail', ['head'], estimate=10.0),
+        ]
+        scheduler = Scheduler(tasks, jobs=1)
+        self.assertEqual(scheduler.priorities['head'], 11.0)
+        scheduler.run()
+        self.assertEqual(self.order, ['head', 'tail', 'short'])
+
+    def test_cycle(self):
+        tasks = [self.task('a', ['b']), self.task('b', ['a'])]
+        self.assertRaises(SchedulerException, Scheduler, tasks)
+
+    def test_unknown_dependency(self):
+        self.assertRaises(SchedulerException, Scheduler,
+                          [self.task('a', ['missing'])])
+
+    def test_duplicate_task(self):
+        self.assertRaises(SchedulerException, Scheduler,
+                          [self.task('a'), self.task('a')])
+
+    def test_failed_task(self):
+        tasks = [self.task('a', fail=True), self.task('b', ['a'])]
+        scheduler = Scheduler(tasks, jobs=2)
+        self.assertRaises(SchedulerException, scheduler.run)
+        self.assertEqual(self.order, ['a'])
+
+
+class ConcurrentResolveTest(ProjectTestCase):
+    """
+    Bundles files lists are resolved from scheduler threads.
+    """
+    def make_config(self):
+        modules = {}
+        for i in range(40):
+            requires = ''.join(
+                'require("m{0}");\n'.format(j)
+                for j in sorted(set([i // 2, i // 3])) if j < i
+            )
+            self.write('m{0}/m{0}.js'.format(i),
+                       requires + 'var m{0};\n'.format(i))
+            self.write('m{0}/m{0}.css'.format(i), '.m{0} {{}}\n'.format(i))
+            modules['m{0}'.format(i)] = 'm{0}'.format(i)
+
+        bundles = {'common': {'modules': ['m5']}}
+        for i in range(20):
+            bundles['b{0}'.format(i)] = {
+                'modules': ['m{0}'.format(39 - i), 'm{0}'.format(i)],
+                'exclude': ['common'],
+            }
+        return self.config(modules, bundles)
+
+    def test_resolve_in_threads(self):
+        expected = dict(
+            (name, (bundle.js_files, bundle.css_files))
+            for name, bundle in self.make_config().bundles.items()
+        )
+
+        for _ in range(20):
+            config = self.make_config()
+            tasks = [
+                Task('resolve:{0}'.format(name),
+                     lambda bundle=bundle: Builder.resolve(bundle))
+                for name, bundle in config.bundles.items()
+            ]
+            Scheduler(tasks, jobs=16).run()
+            for name, bundle in config.bundles.items():
+                self.assertEqual(
+                    (bundle.js_files, bundle.css_files), expected[name]
+                )
+
+
+class BuildTasksTest(ProjectTestCase):
+    def test_mutually_excluding_bundles(self):
+        self.write('a.js', 'var a;\n')
+        self.write('b.js', 'var b;\n')
+        self.write('c.js', 'var c;\n')
+        config = self.config(
+            {'a': 'a', 'b': 'b', 'c': 'c'},
+            {'one': {'modules': ['a', 'c'], 'exclude': ['two']},
+             'two': {'modules': ['b', 'c'], 'exclude': ['one']}}
+        )
+
+        builder = Builder(config, jobs=4)
+        self.assertEqual(
+            sorted(task.name for task in builder.tasks(
+                [config.bundles['one']]
+            ) if task.name.startswith('resolve:')),
+            ['resolve:one']
+        )
+        builder.build()
+        self.assertEqual(self.read('out', 'one.js'), 'var a;\n')
+        self.assertEqual(self.read('out', 'two.js'), 'var b;\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import io
+import json
+import sys
+import unittest
+
+from busta.command_line import main
+from busta.manifest import (ManifestException, build_manifest,
+                            manifest_durations, merge_manifests)
+from busta.shard import (ShardException, bundles_costs, parse_shard,
+                         save_durations, shard_bundles, split_bundles)
+from tests.utils import ProjectTestCase
+
+
+class ParseShardTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_shard('1/1'), (1, 1))
+        self.assertEqual(parse_shard(' 2 / 3 '), (2, 3))
+
+    def test_errors(self):
+        for value in (None, '', '2', '1/', 'a/b', '0/2', '3/2', '1/0'):
+            self.assertRaises(ShardException, parse_shard, value)
+
+
+class SplitBundlesTest(ProjectTestCase):
+    # bundle name => input size
+    SIZES = {'a': 900, 'b': 700, 'c': 500, 'd': 400, 'e': 300, 'f': 100,
+             'g': 100}
+
+    def make_config(self):
+        modules = {}
+        bundles = {}
+        for name, size in self.SIZES.items():
+            self.write('{0}.js'.format(name), 'x' * size)
+            modules[name] = name
+            bundles[name] = {'modules': [name]}
+        return self.config(modules, bundles)
+
+    def test_costs(self):
+        config = self.make_config()
+        self.assertEqual(bundles_costs(config), self.SIZES)
+        durations = dict((name, 1.5) for name in self.SIZES)
+        self.assertEqual(bundles_costs(config, durations), durations)
+        # durations are ignored unless known for every bundle
+        del durations['g']
+        self.assertEqual(bundles_costs(config, durations), self.SIZES)
+
+    def test_balanced(self):
+        shards = split_bundles(self.make_config(), 3)
+        self.assertEqual(shards, [['a', 'f'], ['b', 'e'], ['c', 'd', 'g']])
+        self.assertEqual(sorted(sum(shards, [])), sorted(self.SIZES))
+        loads = [sum(self.SIZES[name] for name in shard) for shard in shards]
+        self.assertEqual(loads, [1000, 1000, 1000])
+
+    def test_deterministic(self):
+        config = self.make_config()
+        expected = split_bundles(config, 3)
+        for _ in range(5):
+            self.assertEqual(split_bundles(self.make_config(), 3), expected)
+
+    def test_more_shards_than_bundles(self):
+        shards = split_bundles(self.make_config(), 9)
+        self.assertEqual(sum(1 for shard in shards if shard), 7)
+
+    def test_shard_durations(self):
+        config = self.make_config()
+        filename = self.path('durations.json')
+        save_durations(filename, dict((name, 1.0) for name in self.SIZES))
+        self.assertEqual(shard_bundles(config, '1/3', filename),
+                         ['a', 'd', 'g'])
+        self.assertEqual(shard_bundles(config, '1/3'), ['a', 'f'])
+        self.assertRaises(ShardException, shard_bundles, config, '1/3',
+                          self.path('missing.json'))
+
+
+class MergeManifestsTest(unittest.TestCase):
+    def manifest(self, **bundles):
+        return {'bundles': dict(
+            (name, {'files': {'{0}.js'.format(name): {'sha1': sha1,
+                                                       'size': 1}},
+                    'duration': duration})
+            for name, (sha1, duration) in bundles.items()
+        )}
+
+    def test_merge(self):
+        manifest = merge_manifests([
+            self.manifest(a=('1', 0.5), b=('2', 1.0)),
+            self.manifest(c=('3', 2.0)),
+            self.manifest(a=('1', 0.7)),
+        ], ['a', 'b', 'c'])
+        self.assertEqual(sorted(manifest['bundles']), ['a', 'b', 'c'])
+        self.assertEqual(manifest_durations(manifest),
+                         {'a': 0.5, 'b': 1.0, 'c': 2.0})
+
+    def test_conflict(self):
+        self.assertRaises(ManifestException, merge_manifests, [
+            self.manifest(a=('1', 0.5)), self.manifest(a=('2', 0.5)),
+        ])
+
+    def test_missing_bundle(self):
+        try:
+            merge_manifests([self.manifest(a=('1', 0.5))], ['a', 'b', 'c'])
+        except ManifestException as exc:
+            self.assertIn('b, c', str(exc))
+        else:
+            self.fail('ManifestException is not raised')
+
+
+class ShardedBuildTest(ProjectTestCase):
+    def busta(self, command, *args):
+        """
+        Run command with project filenames, returns its exit code and output.
+        """
+        argv, stdout = sys.argv, sys.stdout
+        sys.argv = ['busta', command] + [
+            self.path(arg) if arg.endswith('.json') else arg for arg in args
+        ]
+        sys.stdout = io.BytesIO() if bytes is str else io.StringIO()
+        try:
+            main()
+            code = 0
+        except SystemExit as exc:
+            code = exc.code
+        finally:
+            output = sys.stdout.getvalue()
+            sys.argv, sys.stdout = argv, stdout
+        return code, output
+
+    def test_durations_round_trip(self):
+        modules = {}
+        bundles = {}
+        for name in ('a', 'b', 'c', 'd'):
+            self.write('{0}.js'.format(name), 'var {0};\n'.format(name))
+            modules[name] = name
+            bundles[name] = {'modules': [name]}
+        self.config(modules, bundles)
+
+        for shard in ('1/2', '2/2'):
+            self.assertEqual(self.busta(
+                'build', 'busta.json', '--shard', shard, '--manifest',
+                'shard-{0}.json'.format(shard[0])
+            ), (0, ''))
+        self.assertEqual(self.busta(
+            'merge-manifests', 'busta.json', 'manifest.json', 'shard-1.json',
+            'shard-2.json', '--durations', 'durations.json'
+        ), (0, ''))
+
+        with open(self.path('manifest.json')) as file_data:
+            self.assertEqual(sorted(json.load(file_data)['bundles']),
+                             ['a', 'b', 'c', 'd'])
+        with open(self.path('durations.json')) as file_data:
+            durations = json.load(file_data)
+        self.assertEqual(sorted(durations), ['a', 'b', 'c', 'd'])
+
+        # next build is split by merged durations
+        self.assertEqual(self.busta(
+            'build', 'busta.json', '--shard', '1/2', '--shard-durations',
+            'durations.json'
+        ), (0, ''))
+
+    def test_missing_shard(self):
+        self.write('a.js', 'var a;\n')
+        self.write('b.js', 'var b;\n')
+        self.config({'a': 'a', 'b': 'b'},
+                    {'a': {'modules': ['a']}, 'b': {'modules': ['b']}})
+        self.busta('build', 'busta.json', '--shard', '1/2', '--manifest',
+                   'shard-1.json')
+        code, output = self.busta('merge-manifests', 'busta.json',
+                                  'manifest.json', 'shard-1.json')
+        self.assertEqual(code, 1)
+        self.assertIn('missing in merged manifests: b', output)
+
+
+class BuildManifestTest(ProjectTestCase):
+    def test_durations(self):
+        filename = self.write('a.js', 'var a;\n')
+        config = self.config({'a': 'a'}, {'a': {'modules': ['a']}})
+        manifest = build_manifest(config, {'a': [filename]},
+                                  durations={'a': 0.12345})
+        self.assertEqual(manifest['bundles']['a']['duration'], 0.123)
+        self.assertEqual(manifest['bundles']['a']['files']['a.js']['size'], 7)
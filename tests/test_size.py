@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+import zlib
+
+from busta.size import bundles_sizes, deflate_size, gzip_size
+from tests.utils import ProjectTestCase
+
+
+def gzip_data(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class BundleSizeTest(ProjectTestCase):
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        modules = {}
+        for i in range(50):
+            self.write('m{0}.js'.format(i), 'window.m{0} = {0};'.format(i))
+            modules['m{0}'.format(i)] = 'm{0}'.format(i)
+        self.config_obj = self.config(
+            modules, {'all': {'modules': sorted(modules)}},
+            cache_dir='../cache'
+        )
+        self.bundle = self.config_obj.bundles['all']
+
+    def test_gzip_size_of_concatenation(self):
+        data = b''.join(
+            open(filename, 'rb').read() + b'\n'
+            for filename in self.bundle.js_files
+        )
+        self.assertEqual(gzip_size(self.bundle.js_files),
+                         len(gzip_data(data)))
+
+    def test_bundle_gzip_size(self):
+        report = bundles_sizes(self.config_obj)[0]
+        self.assertEqual(report.sizes['js_gzip'],
+                         gzip_size(self.bundle.js_files))
+        # one gzip stream is much smaller than sum of per-file streams
+        self.assertLess(
+            report.sizes['js_gzip'],
+            sum(deflate_size(filename) for filename in self.bundle.js_files)
+        )
+
+    def test_cached_size_is_invalidated(self):
+        bundles_sizes(self.config_obj)
+        self.write('m0.js', 'window.m0 = "changed and a bit longer";')
+        report = bundles_sizes(self.config_obj)[0]
+        self.assertEqual(report.sizes['js_gzip'],
+                         gzip_size(self.bundle.js_files))
+
+
+class DeflateSizeTest(unittest.TestCase):
+    def test_no_gzip_header(self):
+        with tempfile.NamedTemporaryFile() as file_data:
+            file_data.write(b'var a = 1;\n' * 10)
+            file_data.flush()
+            self.assertEqual(
+                deflate_size(file_data.name),
+                len(gzip_data(b'var a = 1;\n' * 10)) - 18
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
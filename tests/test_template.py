@@ -0,0 +1,115 @@
+import os
+import sys
+
+from busta.build import Builder
+from busta.scheduler import SchedulerException
+from busta.template import TemplateCompiler, TemplateException
+from tests.utils import ProjectTestCase
+
+
+# compiler logs compiled files and fails on templates with 'ERROR'
+COMPILER = """
+import json
+import sys
+
+filename = sys.argv[2]
+with open(sys.argv[1], 'a') as log:
+    log.write(filename + '\\n')
+with open(filename) as template:
+    data = template.read()
+if 'ERROR' in data:
+    sys.stderr.write('syntax error in template\\n')
+    sys.exit(1)
+sys.stdout.write('function () { return ' + json.dumps(data.strip()) + '; };')
+"""
+
+
+class TemplatesTest(ProjectTestCase):
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        self.write('app/app.js', 'var app;\n')
+        self.write('app/views/a.xml', 'a')
+        self.write('app/views/b.xml', 'b')
+        self.write('app/views/c.html', 'c')
+        self.write('app/views/d.xml', 'd')
+        with open(self.path('compiler.py'), 'w') as compiler:
+            compiler.write(COMPILER)
+
+    def make_config(self, **params):
+        templates = {'compiler': '{0} {1} {2}'.format(
+            sys.executable, self.path('compiler.py'), self.path('compiled.log')
+        )}
+        templates.update(params)
+        return self.config({'app': 'app'}, {'main': {'modules': ['app']}},
+                           templates=templates)
+
+    def compiled(self):
+        """
+        Returns sorted list of compiled templates names, clears log.
+        """
+        if not os.path.isfile(self.path('compiled.log')):
+            return []
+        with open(self.path('compiled.log')) as log:
+            names = sorted(
+                os.path.basename(line.strip()) for line in log if line.strip()
+            )
+        os.unlink(self.path('compiled.log'))
+        return names
+
+    def test_find_templates(self):
+        for params, names in (({}, ['a.xml', 'b.xml', 'd.xml']),
+                              ({'pattern': '*.html'}, ['c.html'])):
+            module = self.make_config(**params).modules['app']
+            self.assertEqual(
+                [os.path.basename(f) for f in module.template_files], names
+            )
+
+    def test_build(self):
+        Builder(self.make_config(), jobs=2).build()
+        self.assertEqual(self.compiled(), ['a.xml', 'b.xml', 'd.xml'])
+        self.assertEqual(self.read('out', 'main.templates.js'), ''.join([
+            '(function (templates) {\n',
+            'templates["app/views/a"] = function () { return "a"; };\n',
+            'templates["app/views/b"] = function () { return "b"; };\n',
+            'templates["app/views/d"] = function () { return "d"; };\n',
+            '})(window.templates = window.templates || {});\n',
+        ]))
+
+    def test_unchanged_templates_not_recompiled(self):
+        Builder(self.make_config(), jobs=2).build()
+        self.assertEqual(self.compiled(), ['a.xml', 'b.xml', 'd.xml'])
+
+        Builder(self.make_config(), jobs=2).build()
+        self.assertEqual(self.compiled(), [])
+
+        self.write('app/views/b.xml', 'bb')
+        Builder(self.make_config(), jobs=2).build()
+        self.assertEqual(self.compiled(), ['b.xml'])
+        self.assertIn('return "bb"', self.read('out', 'main.templates.js'))
+
+    def test_stale_cache_pruned(self):
+        config = self.make_config()
+        Builder(config).build()
+        cache_dir = TemplateCompiler(config).cache_dir
+        self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+        self.write('app/views/b.xml', 'bb')
+        os.unlink(self.path('src', 'app', 'views', 'd.xml'))
+        Builder(self.make_config()).build()
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_compiler_error(self):
+        self.write('app/views/e.xml', 'ERROR')
+        config = self.make_config()
+        with self.assertRaises(TemplateException) as context:
+            TemplateCompiler(config, jobs=2).compile(
+                config.modules['app'].template_files
+            )
+        message = str(context.exception)
+        self.assertIn('e.xml: syntax error in template', message)
+        self.assertNotIn('a.xml', message)
+
+        # successfully compiled templates are cached anyway
+        self.assertEqual(self.compiled(), ['a.xml', 'b.xml', 'd.xml', 'e.xml'])
+        self.assertRaises(SchedulerException, Builder(config).build)
+        self.assertEqual(self.compiled(), ['e.xml'])
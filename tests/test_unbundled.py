@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+
+from busta.build import Builder
+from tests.utils import ProjectTestCase
+
+
+def sha1(data):
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class UnbundledTest(ProjectTestCase):
+    FILES = {
+        'lib.js': 'var lib;\n',
+        'app/app.js': 'require("lib");\nvar app;\n',
+        'app/a.css': '.a {}\n',
+        'app/b.css': '.b {}\n',
+    }
+
+    def setUp(self):
+        ProjectTestCase.setUp(self)
+        for filename, data in self.FILES.items():
+            self.write(filename, data)
+
+    def make_config(self, bundle=None, **params):
+        bundle = dict({'modules': ['app'], 'output': 'unbundled'},
+                      **(bundle or {}))
+        return self.config({'lib': 'lib', 'app': 'app'}, {'main': bundle},
+                           **params)
+
+    def hashed(self, filename):
+        """
+        Returns expected output path (relative to output directory).
+        """
+        stem, ext = os.path.splitext(filename)
+        return 'modules/{0}.{1}{2}'.format(
+            stem, sha1(self.FILES[filename])[:12], ext
+        )
+
+    def test_hashed_names(self):
+        builder = Builder(self.make_config())
+        builder.build()
+        self.assertEqual(builder.unbundled['main'], {
+            'js': [self.path('out', self.hashed('lib.js')),
+                   self.path('out', self.hashed('app/app.js'))],
+            'css': [self.path('out', self.hashed('app/a.css')),
+                    self.path('out', self.hashed('app/b.css'))],
+        })
+        for filename, data in self.FILES.items():
+            self.assertEqual(self.read('out', self.hashed(filename)), data)
+            output = self.path('out', self.hashed(filename))
+            self.assertEqual(builder.digests[output], sha1(data))
+
+    def test_copied_by_default(self):
+        Builder(self.make_config()).build()
+        self.assertFalse(os.path.samefile(
+            self.path('src', 'lib.js'), self.path('out', self.hashed('lib.js'))
+        ))
+        mode = os.stat(self.path('out', self.hashed('lib.js'))).st_mode
+        self.assertEqual(mode & 0o444, 0o444 & ~self.umask())
+
+    def umask(self):
+        umask = os.umask(0)
+        os.umask(umask)
+        return umask
+
+    def test_hard_links(self):
+        Builder(self.make_config(hard_links=True)).build()
+        self.assertTrue(os.path.samefile(
+            self.path('src', 'lib.js'), self.path('out', self.hashed('lib.js'))
+        ))
+
+    def test_hard_link_fallback(self):
+        def link(source, target):
+            raise OSError('cross-device link')
+
+        original, os.link = os.link, link
+        try:
+            Builder(self.make_config(hard_links=True)).build()
+        finally:
+            os.link = original
+        output = self.path('out', self.hashed('lib.js'))
+        self.assertFalse(os.path.samefile(self.path('src', 'lib.js'), output))
+        self.assertEqual(self.read('out', self.hashed('lib.js')), 'var lib;\n')
+
+    def test_existing_output_reused(self):
+        Builder(self.make_config()).build()
+        output = self.path('out', self.hashed('lib.js'))
+        os.utime(output, (1, 1))
+
+        builder = Builder(self.make_config())
+        builder.build()
+        self.assertEqual(builder.changed, [])
+        self.assertEqual(os.path.getmtime(output), 1)
+
+    def test_broken_output_replaced(self):
+        Builder(self.make_config()).build()
+        output = self.path('out', self.hashed('lib.js'))
+        with open(output, 'w') as file_data:
+            file_data.write('var broken;\n')
+
+        builder = Builder(self.make_config())
+        builder.build()
+        self.assertEqual(builder.changed, [output])
+        self.assertEqual(self.read('out', self.hashed('lib.js')), 'var lib;\n')
+
+    def test_processed_outputs(self):
+        config = self.make_config(
+            {'pre_processors': ['upper']},
+            pre_processors={'upper': 'tr a-z A-Z'}
+        )
+        builder = Builder(config)
+        builder.build()
+        output = builder.unbundled['main']['js'][0]
+        self.assertEqual(os.path.basename(output),
+                         'lib.{0}.js'.format(sha1('VAR LIB;\n')[:12]))
+        with open(output) as file_data:
+            self.assertEqual(file_data.read(), 'VAR LIB;\n')
+
+        # same processed content keeps existing output
+        os.utime(output, (1, 1))
+        Builder(config).build()
+        self.assertEqual(os.path.getmtime(output), 1)
+
+    def test_preload(self):
+        Builder(self.make_config()).build()
+        self.assertEqual(json.loads(self.read('out', 'main.preload.json')), {
+            'js': [self.hashed('lib.js'), self.hashed('app/app.js')],
+            'css': [self.hashed('app/a.css'), self.hashed('app/b.css')],
+        })
+        self.assertEqual(self.read('out', 'main.preload.html').splitlines(), [
+            '<link rel="preload" href="{0}" as="style">'.format(
+                self.hashed('app/a.css')),
+            '<link rel="preload" href="{0}" as="style">'.format(
+                self.hashed('app/b.css')),
+            '<link rel="preload" href="{0}" as="script">'.format(
+                self.hashed('lib.js')),
+            '<link rel="preload" href="{0}" as="script">'.format(
+                self.hashed('app/app.js')),
+            '<link rel="stylesheet" href="{0}">'.format(
+                self.hashed('app/a.css')),
+            '<link rel="stylesheet" href="{0}">'.format(
+                self.hashed('app/b.css')),
+            '<script src="{0}"></script>'.format(self.hashed('lib.js')),
+            '<script src="{0}"></script>'.format(self.hashed('app/app.js')),
+        ])
@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import busta
+from busta.worker import (HEADER, WorkerCrashed, WorkerPool, WorkerTimeout,
+                          read_exactly, read_frame, serve, write_frame)
+from busta.writer import StreamWriter
+
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(busta.__file__)))
+
+# worker, which crashes on job while marker file does not exist (creating it)
+CRASHING_WORKER = """
+import os, sys
+from busta.worker import serve
+
+def handler(data, ext):
+    if not os.path.exists(sys.argv[1]):
+        open(sys.argv[1], 'w').close()
+        os._exit(1)
+    return data.upper()
+
+serve(handler)
+"""
+
+# worker, which writes half of result and dies, counting jobs in file
+PARTIAL_WORKER = """
+import json, os, struct, sys
+from busta.worker import read_frame, write_frame
+
+stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+while True:
+    header = json.loads(read_frame(stdin).decode('utf-8'))
+    data = read_frame(stdin)
+    if header['type'] == 'ping':
+        write_frame(stdout, b'{"ok": true}')
+        write_frame(stdout, b'')
+        stdout.flush()
+        continue
+    with open(sys.argv[1], 'a') as jobs:
+        jobs.write('job\\n')
+    write_frame(stdout, b'{"ok": true}')
+    stdout.write(struct.pack('>I', len(data)))
+    stdout.write(data[:len(data) // 2])
+    stdout.flush()
+    os._exit(1)
+"""
+
+# worker, which returns its pid and hangs on 'hang' job
+PID_WORKER = """
+import os, time
+from busta.worker import serve
+
+def handler(data, ext):
+    if data == b'hang':
+        time.sleep(3600)
+    return str(os.getpid()).encode('ascii')
+
+serve(handler)
+"""
+
+
+class FramesTest(unittest.TestCase):
+    def test_frame(self):
+        stream = io.BytesIO()
+        write_frame(stream, b'data')
+        write_frame(stream, b'')
+        self.assertEqual(stream.getvalue()[:HEADER.size],
+                         b'\x00\x00\x00\x04')
+        stream.seek(0)
+        self.assertEqual(read_frame(stream), b'data')
+        self.assertEqual(read_frame(stream), b'')
+        self.assertRaises(EOFError, read_frame, stream)
+
+    def test_truncated_frame(self):
+        stream = io.BytesIO(b'\x00\x00\x00\x04da')
+        self.assertRaises(EOFError, read_frame, stream)
+        self.assertRaises(EOFError, read_exactly, io.BytesIO(b'ab'), 3)
+
+    def test_serve(self):
+        stdin = io.BytesIO()
+        for header, data in (({'type': 'ping'}, b''),
+                             ({'type': 'job', 'ext': 'js'}, b'var a;'),
+                             ({'type': 'job', 'ext': 'css'}, b'')):
+            write_frame(stdin, json.dumps(header).encode('utf-8'))
+            write_frame(stdin, data)
+        stdin.seek(0)
+        stdout = io.BytesIO()
+
+        def handler(data, ext):
+            if ext == 'css':
+                raise ValueError('bad css')
+            return data.upper()
+
+        serve(handler, stdin, stdout)
+        stdout.seek(0)
+
+        responses = [
+            (json.loads(read_frame(stdout).decode('utf-8')),
+             read_frame(stdout))
+            for _ in range(3)
+        ]
+        self.assertEqual(responses, [
+            ({'ok': True}, b''),
+            ({'ok': True}, b'VAR A;'),
+            ({'ok': False, 'error': 'bad css'}, b''),
+        ])
+
+
+class WorkerPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pythonpath = os.environ.get('PYTHONPATH')
+        os.environ['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [SRC_DIR, self.pythonpath])
+        )
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        if self.pythonpath is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = self.pythonpath
+        shutil.rmtree(self.directory)
+
+    def pool(self, script=None, **params):
+        if script is None:
+            command = '{0} -m busta.worker'.format(sys.executable)
+        else:
+            filename = os.path.join(self.directory, 'worker.py')
+            with open(filename, 'w') as file_data:
+                file_data.write(script)
+            command = '{0} {1} {2}'.format(
+                sys.executable, filename,
+                os.path.join(self.directory, 'marker')
+            )
+        pool = WorkerPool(command, **params)
+        self.pools.append(pool)
+        return pool
+
+    def process(self, pool, data):
+        with tempfile.TemporaryFile() as stdin:
+            stdin.write(data)
+            stdin.seek(0)
+            output = StreamWriter(io.BytesIO())
+            pool.process(stdin, output, 'js')
+            return output.file.getvalue()
+
+    def test_identity_worker(self):
+        pool = self.pool(size=2)
+        data = b'var a = 1;\n' * 10000
+        self.assertEqual(self.process(pool, data), data)
+        self.assertEqual(self.process(pool, b''), b'')
+
+    def test_pool_reuses_worker(self):
+        pool = self.pool(PID_WORKER, size=1)
+        pids = set(self.process(pool, b'job') for _ in range(3))
+        self.assertEqual(len(pids), 1)
+        self.assertEqual(len(pool.workers), 1)
+
+    def test_crash_retry(self):
+        pool = self.pool(CRASHING_WORKER, size=1)
+        self.assertEqual(self.process(pool, b'var a;'), b'VAR A;')
+        self.assertTrue(os.path.exists(os.path.join(self.directory,
+                                                    'marker')))
+
+    def test_no_retry_after_partial_output(self):
+        pool = self.pool(PARTIAL_WORKER, size=1)
+        self.assertRaises(WorkerCrashed, self.process, pool, b'var abc;')
+        with open(os.path.join(self.directory, 'marker')) as jobs:
+            self.assertEqual(jobs.read(), 'job\n')
+
+    def test_timeout(self):
+        pool = self.pool(PID_WORKER, size=1, timeout=0.5)
+        started = time.time()
+        self.assertRaises(WorkerTimeout, self.process, pool, b'hang')
+        self.assertLess(time.time() - started, 10)
+        # hung worker is replaced by new one
+        self.assertTrue(self.process(pool, b'job').isdigit())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from busta.writer import (HashedOutputWriter, OutputWriter, file_digest,
+                          hashed_name)
+
+
+class OutputWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'out', 'bundle.js')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data, filename=None):
+        with OutputWriter(filename or self.filename) as output:
+            output.write(data)
+        return output
+
+    def files(self):
+        result = []
+        for root, dirs, files in os.walk(self.directory):
+            result.extend(files)
+        return sorted(result)
+
+    def test_write(self):
+        output = self.write(b'var a;\n')
+        self.assertTrue(output.changed)
+        self.assertEqual(output.size, 7)
+        self.assertEqual(output.last_byte, b'\n')
+        with open(self.filename, 'rb') as file_data:
+            self.assertEqual(file_data.read(), b'var a;\n')
+        self.assertEqual(output.digest, file_digest(self.filename))
+        self.assertEqual(self.files(), ['bundle.js'])
+
+    def test_unchanged_keeps_mtime(self):
+        self.write(b'var a;\n')
+        os.utime(self.filename, (1000000000, 1000000000))
+
+        output = self.write(b'var a;\n')
+        self.assertFalse(output.changed)
+        self.assertEqual(os.stat(self.filename).st_mtime, 1000000000)
+        self.assertEqual(self.files(), ['bundle.js'])
+
+    def test_changed_replaces_file(self):
+        self.write(b'var a;\n')
+        os.utime(self.filename, (1000000000, 1000000000))
+
+        output = self.write(b'var b;\n')
+        self.assertTrue(output.changed)
+        self.assertNotEqual(os.stat(self.filename).st_mtime, 1000000000)
+        with open(self.filename, 'rb') as file_data:
+            self.assertEqual(file_data.read(), b'var b;\n')
+
+    def test_failed_write_leaves_no_temp_file(self):
+        self.write(b'var a;\n')
+
+        def fail():
+            with OutputWriter(self.filename) as output:
+                output.write(b'partial')
+                raise ValueError('processor failed')
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(self.files(), ['bundle.js'])
+        with open(self.filename, 'rb') as file_data:
+            self.assertEqual(file_data.read(), b'var a;\n')
+
+    def test_failed_first_write_leaves_nothing(self):
+        def fail():
+            with OutputWriter(self.filename) as output:
+                output.write(b'partial')
+                raise ValueError('processor failed')
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(self.files(), [])
+
+
+class HashedOutputWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename_format = os.path.join(self.directory, 'a.{0}.js')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data):
+        with HashedOutputWriter(self.filename_format) as output:
+            output.write(data)
+        return output
+
+    def test_hashed_name(self):
+        output = self.write(b'var a;\n')
+        self.assertEqual(output.filename,
+                         hashed_name(self.filename_format, output.digest))
+        self.assertTrue(os.path.isfile(output.filename))
+        self.assertTrue(output.changed)
+
+    def test_existing_file_is_kept(self):
+        first = self.write(b'var a;\n')
+        os.utime(first.filename, (1000000000, 1000000000))
+
+        second = self.write(b'var a;\n')
+        self.assertEqual(second.filename, first.filename)
+        self.assertFalse(second.changed)
+        self.assertEqual(os.stat(first.filename).st_mtime, 1000000000)
+        self.assertEqual(os.listdir(self.directory),
+                         [os.path.basename(first.filename)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Tests helpers.
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ProjectTestCase(unittest.TestCase):
+    """
+    Test case with temporary project directory: sources are in 'src',
+    outputs are in 'out', caches are in 'cache'.
+    """
+    root = None  # temporary project directory
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, *parts):
+        """
+        Returns absolute path in project directory.
+        """
+        return os.path.join(self.root, *parts)
+
+    def write(self, filename, data=''):
+        """
+        Write source file, returns its absolute path.
+        """
+        filename = self.path('src', filename)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as file_data:
+            file_data.write(data)
+        return filename
+
+    def read(self, *parts):
+        """
+        Returns content of project file.
+        """
+        with open(self.path(*parts)) as file_data:
+            return file_data.read()
+
+    def config(self, modules, bundles, **params):
+        """
+        Write config file, returns new config object.
+        """
+        from busta.config import Config
+
+        config = {
+            'root_dir': 'src',
+            'output_dir': '../out',
+            'cache_dir': '../cache',
+            'modules': modules,
+            'bundles': bundles,
+        }
+        config.update(params)
+        filename = self.path('busta.json')
+        with open(filename, 'w') as file_data:
+            json.dump(config, file_data)
+        return Config(filename)